@@ -0,0 +1,73 @@
+"""Upload size and recognition latency before/after capture downsampling.
+
+Run from the project root with optional 48 kHz stereo WAV fixtures:
+    python -m benchmarks.bench_capture [fixture.wav ...] [--live]
+
+Without fixtures a synthetic 5 s signal is used. --live also sends both
+versions to Google Speech and reports the round-trip time.
+"""
+import math
+import struct
+import sys
+import time
+import wave
+from typing import List, Tuple
+import speech_recognition as sr
+from src.resample import Downsampler
+
+LEGACY_RATE: int = 48000
+LEGACY_WIDTH: int = 4
+TARGET_RATE: int = 16000
+
+
+def synthetic(seconds: float = 5.0) -> bytes:
+    count = int(seconds * LEGACY_RATE)
+    samples = (
+        int(6000 * math.sin(2 * math.pi * 220 * i / LEGACY_RATE) * (0.5 + 0.5 * math.sin(2 * math.pi * 3 * i / LEGACY_RATE)))
+        for i in range(count)
+    )
+    return b"".join(struct.pack("<hh", s, s) for s in samples)
+
+
+def load(path: str) -> bytes:
+    with wave.open(path, "rb") as f:
+        if (f.getframerate(), f.getnchannels(), f.getsampwidth()) != (LEGACY_RATE, 2, 2):
+            raise ValueError(f"{path}: expected 48 kHz stereo 16-bit")
+        return f.readframes(f.getnframes())
+
+
+def recognize(audio: sr.AudioData) -> Tuple[str, float]:
+    start = time.perf_counter()
+    try:
+        text = sr.Recognizer().recognize_google(audio, language="de-DE")
+    except sr.UnknownValueError:
+        text = "<not understood>"
+    return text, time.perf_counter() - start
+
+
+def main(args: List[str]) -> None:
+    live = "--live" in args
+    fixtures = [(p, load(p)) for p in args if p != "--live"] or [("synthetic", synthetic())]
+
+    for name, pcm in fixtures:
+        seconds = len(pcm) / (LEGACY_RATE * LEGACY_WIDTH)
+        legacy = sr.AudioData(pcm, LEGACY_RATE, LEGACY_WIDTH)
+
+        start = time.perf_counter()
+        mono = Downsampler(TARGET_RATE).convert(pcm)
+        convert_time = time.perf_counter() - start
+        converted = sr.AudioData(mono, TARGET_RATE, 2)
+
+        before = len(legacy.get_wav_data())
+        after = len(converted.get_wav_data())
+        print(f"{name}: {seconds:.1f}s audio")
+        print(f"  WAV bytes   before {before:10d}  after {after:10d}  ({before / after:.1f}x smaller)")
+        print(f"  conversion  {convert_time * 1000:.1f} ms ({seconds / convert_time:.0f}x realtime)")
+        if live:
+            for label, audio in (("before", legacy), ("after", converted)):
+                text, elapsed = recognize(audio)
+                print(f"  recognition {label:6s} {elapsed * 1000:7.0f} ms  {text!r}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,72 @@
+"""Decode throughput for Gemini server messages, old path vs GeminiMessageDecoder.
+
+Run from the project root:
+    python -m benchmarks.bench_decode [messages.jsonl]
+
+The optional fixture holds one raw server message per line, e.g. captured by
+logging raw_response in GeminiWebSocket.receive_turn. Without it a 10 s
+answer in Gemini's format is synthesised.
+"""
+import base64
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List
+from src.decode import GeminiMessageDecoder, loads
+
+REPEAT: int = 20
+
+
+def synthetic_turn(seconds: float = 10.0, chunk_bytes: int = 11520) -> List[bytes]:
+    pcm = os.urandom(int(seconds * 24000) * 2)
+    messages = []
+    for pos in range(0, len(pcm), chunk_bytes):
+        data = base64.b64encode(pcm[pos:pos + chunk_bytes]).decode("ascii")
+        messages.append(json.dumps({
+            "serverContent": {
+                "modelTurn": {"parts": [{"inlineData": {"mimeType": "audio/pcm;rate=24000", "data": data}}]}
+            }
+        }).encode("utf-8"))
+    messages.append(json.dumps({"serverContent": {"turnComplete": True}}).encode("utf-8"))
+    return messages
+
+
+def legacy_decode(raw: bytes) -> List[bytes]:
+    """What GeminiWebSocket.process_text used to do per message."""
+    audio = []
+    response: Dict[str, Any] = json.loads(raw.decode("utf-8"))
+    if "serverContent" in response:
+        if "modelTurn" in response["serverContent"]:
+            for part in response["serverContent"]["modelTurn"]["parts"]:
+                if "inlineData" in part:
+                    b64data = part["inlineData"]["data"]
+                    if b64data:
+                        audio.append(base64.b64decode(b64data))
+    return audio
+
+
+def main(args: List[str]) -> None:
+    if args:
+        with open(args[0], "rb") as f:
+            turn = [line.rstrip(b"\n") for line in f if line.strip()]
+    else:
+        turn = synthetic_turn()
+    size = sum(len(m) for m in turn)
+
+    decoder = GeminiMessageDecoder()
+    expected = [a for m in turn for a in legacy_decode(m)]
+    assert [a for m in turn for a in decoder.decode(m).audio] == expected
+
+    print(f"{len(turn)} messages, {size / 1e6:.2f} MB per turn, json backend: {loads.__module__}")
+    for name, decode in (("legacy", legacy_decode), ("decoder", decoder.decode)):
+        start = time.perf_counter()
+        for _ in range(REPEAT):
+            for message in turn:
+                decode(message)
+        elapsed = (time.perf_counter() - start) / REPEAT
+        print(f"{name:8s} {size / 1e6 / elapsed:8.1f} MB/s  {elapsed * 1000:7.2f} ms event loop time per turn")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
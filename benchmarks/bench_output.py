@@ -0,0 +1,127 @@
+"""Player thread cost of PCM output versus pre-encoded Opus output.
+
+Run from the project root:
+    python -m benchmarks.bench_output [--streams 8] [--answer-seconds 5]
+        [--workers 2] [--opus /path/to/libopus.so]
+
+Every stream gets its own player thread that works like discord's
+AudioPlayer: read() a frame every 20 ms and, for QueuedStreamingPCMAudio,
+Opus-encode it right there like VoiceClient.send_audio_packet does. One
+feeder thread stands in for the event loop and feeds 24 kHz mono answer
+chunks faster than real time, like Gemini. OpusStreamingAudio encodes on
+--workers encoder threads instead.
+
+Reports the CPU time the player threads spend per frame and how many frames
+missed their 20 ms slot. Needs libopus; pass --opus if discord.py does not
+find it on its own.
+"""
+import contextlib
+import io
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+import numpy as np
+import discord.opus
+from src.stream import OpusStreamingAudio, QueuedStreamingPCMAudio
+
+FRAME_SECONDS: float = 0.02
+CHUNK_BYTES: int = 9600  # 200 ms bei 24 kHz mono, so groß wie Geminis Chunks
+CHUNK_DELAY: float = 0.02
+
+
+def speech_like(seconds: float) -> bytes:
+    """24 kHz mono 16-bit, a few harmonics with a syllable envelope and noise."""
+    rng = np.random.default_rng(1)
+    t = np.arange(int(seconds * 24000)) / 24000
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / 24000
+    voice = sum(np.sin(k * phase) / k for k in range(1, 8))
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t)
+    signal = voice * envelope * 6000 + rng.normal(0, 300, len(t))
+    return np.clip(signal, -32768, 32767).astype("<i2").tobytes()
+
+
+def parse(args: List[str]) -> Dict[str, Any]:
+    options: Dict[str, Any] = {"streams": 8, "answer-seconds": 5.0, "workers": 2, "opus": ""}
+    it = iter(args)
+    for arg in it:
+        key = arg[2:]
+        options[key] = type(options[key])(next(it))
+    return options
+
+
+def play(source: Any, encode: bool, results: List[Tuple[float, float, int]]) -> None:
+    """One player thread, the loop of discord.player.AudioPlayer._do_run."""
+    encoder = discord.opus.Encoder() if encode else None
+    cpu_per_frame = []
+    late = 0
+    start = time.perf_counter()
+    loops = 0
+    while True:
+        cpu = time.thread_time()
+        data = source.read()
+        if not data:
+            break
+        if encoder is not None:
+            encoder.encode(data, encoder.SAMPLES_PER_FRAME)
+        cpu_per_frame.append(time.thread_time() - cpu)
+        loops += 1
+        delay = start + FRAME_SECONDS * (loops + 1) - time.perf_counter()
+        if delay < 0:
+            late += 1
+        time.sleep(max(0.0, delay))
+    source.cleanup()
+    results.append((float(np.mean(cpu_per_frame)), float(np.percentile(cpu_per_frame, 99)), late))
+
+
+def run(name: str, make_source: Callable[[], Any], encode: bool, options: Dict[str, Any], answer: bytes) -> str:
+    sources = [make_source() for _ in range(options["streams"])]
+    results: List[Tuple[float, float, int]] = []
+    players = [threading.Thread(target=play, args=(s, encode, results)) for s in sources]
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for player in players:
+        player.start()
+    # Der "Event-Loop": alle Antworten gleichzeitig, schneller als Echtzeit
+    for pos in range(0, len(answer), CHUNK_BYTES):
+        for source in sources:
+            source.feed(answer[pos:pos + CHUNK_BYTES])
+        time.sleep(CHUNK_DELAY)
+    for source in sources:
+        source.finish()
+    for player in players:
+        player.join()
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    mean = sum(r[0] for r in results) / len(results)
+    p99 = max(r[1] for r in results)
+    late = sum(r[2] for r in results)
+    underruns = sum(s.stats()["underruns"] for s in sources)
+    return (f"{name:6s} player cpu/frame avg {mean * 1e6:7.1f} us  p99 {p99 * 1e6:7.1f} us  "
+            f"late frames {late:4d}  underruns {underruns:3d}  "
+            f"process cpu {cpu / wall * 100:5.1f}% of a core")
+
+
+def main(args: List[str]) -> None:
+    options = parse(args)
+    if options["opus"]:
+        discord.opus.load_opus(options["opus"])
+    if not discord.opus.is_loaded() and not discord.opus._load_default():
+        print("libopus not found, pass --opus /path/to/libopus.so")
+        return
+    answer = speech_like(options["answer-seconds"])
+    print(f"{options['streams']} streams x {options['answer-seconds']}s answer, "
+          f"{options['workers']} encoder workers")
+    # cleanup() der Quellen loggt, das gehört nicht in den Bericht
+    with contextlib.redirect_stdout(io.StringIO()):
+        pcm = run("pcm", QueuedStreamingPCMAudio, True, options, answer)
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            opus = run("opus", lambda: OpusStreamingAudio(pool), False, options, answer)
+    print(pcm)
+    print(opus)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,211 @@
+"""Offline load test: N simulated guilds talking to the bot at the same time.
+
+Run from the project root:
+    python -m benchmarks.bench_replay [fixture.wav ...] [--guilds 4] [--turns 5]
+        [--mode text|audio] [--stt-delay 0.3] [--answer-seconds 2]
+        [--chunk-bytes 9600] [--chunk-delay 0.02] [--output pcm|opus] [--fast] [--verbose]
+
+Every guild gets its own AudioProcessor and Gemini session, exactly like
+/chat does. A voice receive thread per guild replays the 48 kHz stereo WAV
+fixtures (or a synthetic utterance) through AudioProcessor.write between the
+speaking start/stop listeners, 20 ms packets at real-time pace unless --fast
+is given. Speech recognition is replaced by a stub that sleeps --stt-delay
+seconds, Gemini by src.fake_gemini, and a fake voice client reads the answer
+from QueuedStreamingPCMAudio (or OpusStreamingAudio with --output opus)
+every 20 ms like discord's player thread.
+
+The bot's own log output is swallowed unless --verbose is given. Reports
+turns/second, latency percentiles from the per-turn traces, CPU per
+simulated guild and playback underruns.
+"""
+import asyncio
+import contextlib
+import gc
+import io
+import statistics
+import sys
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+import src.record as record
+from src.fake_discord import (FRAME_SECONDS, PACKET_BYTES, FakeBot, FakeChannel, FakePacket, FakeUser,
+                              FakeVoiceClient)
+from src.fake_gemini import FakeGeminiServer
+from src.metrics import TurnTrace, metrics
+from src.sessions import GeminiSessionManager
+from benchmarks.bench_capture import synthetic
+
+
+def load(path: str) -> bytes:
+    with wave.open(path, "rb") as f:
+        if (f.getframerate(), f.getnchannels(), f.getsampwidth()) != (48000, 2, 2):
+            raise ValueError(f"{path}: expected 48 kHz stereo 16-bit")
+        return f.readframes(f.getnframes())
+
+
+def stub_recognizer(delay: float) -> Callable[[Any, float], str]:
+    def recognize(audio: Any, deadline: float) -> str:
+        time.sleep(delay)
+        return f"{record.WAKE_WORD} wie geht es dir"
+    return recognize
+
+
+def parse(args: List[str]) -> Tuple[Dict[str, Any], List[str]]:
+    options: Dict[str, Any] = {
+        "guilds": 4, "turns": 5, "mode": "text", "stt-delay": 0.3,
+        "answer-seconds": 2.0, "chunk-bytes": 9600, "chunk-delay": 0.02, "output": "pcm",
+        "fast": False, "verbose": False,
+    }
+    fixtures = []
+    it = iter(args)
+    for arg in it:
+        if arg in ("--fast", "--verbose"):
+            options[arg[2:]] = True
+        elif arg.startswith("--"):
+            key = arg[2:]
+            default = options[key]
+            options[key] = type(default)(next(it))
+        else:
+            fixtures.append(arg)
+    return options, fixtures
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def replay(processor: record.AudioProcessor,
+           user: FakeUser,
+           utterances: List[bytes],
+           turns: int,
+           fast: bool,
+           finished: Callable[[int], bool]) -> None:
+    """Voice receive thread of one guild."""
+    for turn in range(turns):
+        pcm = utterances[turn % len(utterances)]
+        processor.on_voice_member_speaking_start(user)
+        next_packet = time.perf_counter()
+        for pos in range(0, len(pcm), PACKET_BYTES):
+            processor.write(user, FakePacket(user.id, pcm[pos:pos + PACKET_BYTES]))
+            if not fast:
+                next_packet += FRAME_SECONDS
+                time.sleep(max(0.0, next_packet - time.perf_counter()))
+        processor.on_voice_member_speaking_stop(user)
+        # Erst weitersprechen, wenn die Antwort fertig abgespielt ist, sonst wäre es ein Barge-in
+        deadline = time.monotonic() + 60
+        while not finished(turn + 1) and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+
+async def run(options: Dict[str, Any], utterances: List[bytes]) -> str:
+    loop = asyncio.get_running_loop()
+    record.convert_audio_to_text = stub_recognizer(options["stt-delay"])
+
+    traces: List[TurnTrace] = []
+    done_per_speaker: Dict[int, int] = {}
+    lock = threading.Lock()
+    record_trace = metrics.record
+
+    def collect(trace: TurnTrace) -> None:
+        record_trace(trace)
+        with lock:
+            traces.append(trace)
+            speaker = trace.labels.get("speaker")
+            done_per_speaker[speaker] = done_per_speaker.get(speaker, 0) + 1
+
+    metrics.record = collect
+
+    async with FakeGeminiServer(answer_seconds=options["answer-seconds"],
+                                chunk_bytes=options["chunk-bytes"],
+                                chunk_delay=options["chunk-delay"]) as server:
+        guilds = options["guilds"]
+        encode_pool = ThreadPoolExecutor(max_workers=2) if options["output"] == "opus" else None
+        sessions = GeminiSessionManager(uri=server.uri, max_sessions=guilds, encode_pool=encode_pool)
+        voice_clients = []
+        threads = []
+        for guild in range(guilds):
+            user = FakeUser(guild + 1)
+            session = await sessions.get(guild)
+            processor = record.AudioProcessor(user, FakeChannel(), FakeBot(loop), session, input_mode=options["mode"])
+            voice_client = FakeVoiceClient()
+            processor._voice_client = voice_client
+            voice_clients.append(voice_client)
+
+            def finished(count: int, user_id: int = user.id, vc: FakeVoiceClient = voice_client) -> bool:
+                with lock:
+                    return done_per_speaker.get(user_id, 0) >= count and not vc.is_playing()
+
+            threads.append(threading.Thread(
+                target=replay,
+                args=(processor, user, utterances, options["turns"], options["fast"], finished),
+                daemon=True,
+            ))
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        for thread in threads:
+            thread.start()
+        while any(t.is_alive() for t in threads):
+            await asyncio.sleep(0.05)
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        await sessions.close_all()
+        # Player-Threads noch ausspielen lassen, damit cleanup() gezählt wird
+        for voice_client in voice_clients:
+            if voice_client.thread:
+                voice_client.thread.join(timeout=5)
+            # AudioSource.__del__ ruft cleanup() nochmal auf, das soll nicht erst nach dem Bericht passieren
+            voice_client.source = None
+            voice_client.thread = None
+        gc.collect()
+        if encode_pool:
+            encode_pool.shutdown()
+
+    metrics.record = record_trace
+    answered = [t for t in traces if t.outcome == "answered"]
+    totals = [max(t.marks.values()) - t.started_at for t in answered]
+    until_playback = [t.marks["playback_started"] - t.started_at for t in answered if "playback_started" in t.marks]
+    outcomes: Dict[str, int] = {}
+    for t in traces:
+        outcomes[t.outcome] = outcomes.get(t.outcome, 0) + 1
+
+    lines = [
+        f"{guilds} guilds x {options['turns']} turns, mode {options['mode']}, "
+        f"stt {options['stt-delay'] * 1000:.0f} ms, answer {options['answer-seconds']}s "
+        f"in {options['chunk-bytes']} byte chunks every {options['chunk-delay'] * 1000:.0f} ms, {options['output']} output",
+        f"  outcomes          {outcomes}",
+        f"  turns/second      {len(answered) / wall:.2f} ({wall:.1f}s wall)",
+    ]
+    for name, values in (("until playback", until_playback), ("whole turn", totals)):
+        if values:
+            lines.append(f"  {name:17s} p50 {percentile(values, 0.5) * 1000:7.1f} ms  "
+                         f"p95 {percentile(values, 0.95) * 1000:7.1f} ms  "
+                         f"p99 {percentile(values, 0.99) * 1000:7.1f} ms  "
+                         f"mean {statistics.mean(values) * 1000:7.1f} ms")
+    lines.append(f"  cpu per guild     {cpu / guilds / wall * 100:.1f}% of a core ({cpu:.2f}s cpu total)")
+    lines.append(f"  playback          {sum(v.frames for v in voice_clients)} frames, "
+                 f"{sum(v.late_frames for v in voice_clients)} late, "
+                 f"{sum(v.underruns for v in voice_clients)} underruns, "
+                 f"{sum(v.rebuffers for v in voice_clients)} rebuffers")
+    lines.append("  stage (time since previous stage)")
+    for stage, summary in metrics.stats()["stages"].items():
+        lines.append(f"    {stage:18s} avg {summary['avg_ms']:7.1f} ms  max {summary['max_ms']:7.1f} ms")
+    return "\n".join(lines)
+
+
+def main(args: List[str]) -> None:
+    options, paths = parse(args)
+    utterances = [load(p) for p in paths] or [synthetic(2.0)]
+    log = sys.stdout if options["verbose"] else io.StringIO()
+    with contextlib.redirect_stdout(log):
+        result = asyncio.run(run(options, utterances))
+    print(result)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,101 @@
+"""Accuracy and cost of the local wake word gate on a labelled fixture set.
+
+Run from the project root:
+    python -m benchmarks.bench_wakeword [recordings/ with/ without/]
+
+``recordings/`` holds the wake word recordings the spotter matches against
+(WAKE_WORD_RECORDINGS), ``with/`` utterances that start with the wake word
+and ``without/`` utterances that do not, all 48 kHz stereo 16-bit WAV as
+captured from discord. Without arguments a synthetic set is generated.
+
+For every sensitivity the false reject rate (wake word said but nothing sent
+to Google), the false accept rate and the recognition requests saved on
+``without/`` are reported, with and without the cloud fallback for unsure
+matches.
+"""
+import os
+import sys
+import tempfile
+import time
+import wave
+from typing import List, Tuple
+import numpy as np
+from src.wakeword import ACCEPT, UNSURE, WakeWordSpotter
+
+RATE: int = 48000
+SENSITIVITIES: Tuple[float, ...] = (0.0, 0.25, 0.5, 1.0)
+
+
+def load_dir(path: str) -> List[bytes]:
+    result = []
+    for name in sorted(os.listdir(path)):
+        if not name.lower().endswith(".wav"):
+            continue
+        with wave.open(os.path.join(path, name), "rb") as f:
+            if (f.getframerate(), f.getnchannels(), f.getsampwidth()) != (RATE, 2, 2):
+                raise ValueError(f"{name}: expected 48 kHz stereo 16-bit")
+            result.append(f.readframes(f.getnframes()))
+    return result
+
+
+def synthetic_word(tones: List[float], speed: float, seed: int, lead: float = 0.3, rest: float = 1.0) -> bytes:
+    """A tone sequence standing in for a spoken word, followed by more 'speech'."""
+    rng = np.random.default_rng(seed)
+    n = int(0.5 / speed * RATE)
+    t = np.arange(n) / RATE
+    word = np.zeros(n)
+    for tone, idx in zip(tones, np.array_split(np.arange(n), len(tones))):
+        envelope = np.sin(np.pi * np.linspace(0, 1, len(idx)))
+        word[idx] = (np.sin(2 * np.pi * tone * t[idx]) + 0.5 * np.sin(2 * np.pi * 2.3 * tone * t[idx])) * envelope
+    after = 0.8 * np.sin(2 * np.pi * rng.uniform(200, 400) * np.arange(int(rest * RATE)) / RATE)
+    signal = np.concatenate([np.zeros(int(lead * RATE)), word, np.zeros(RATE // 2), after]) * 8000
+    signal += rng.normal(0, 200, len(signal))
+    return np.repeat(signal.astype("<i2")[:, None], 2, axis=1).tobytes()
+
+
+def synthetic_set() -> Tuple[str, List[bytes], List[bytes]]:
+    wake = [400.0, 900.0, 500.0, 1100.0]
+    directory = tempfile.mkdtemp(prefix="wakeword-")
+    for i, speed in enumerate((0.9, 1.0, 1.1)):
+        with wave.open(os.path.join(directory, f"take{i}.wav"), "wb") as f:
+            f.setnchannels(2)
+            f.setsampwidth(2)
+            f.setframerate(RATE)
+            f.writeframes(synthetic_word(wake, speed, i, lead=0.0, rest=0.0))
+    rng = np.random.default_rng(42)
+    positives = [synthetic_word(wake, rng.uniform(0.7, 1.3), 100 + i, lead=rng.uniform(0, 0.4)) for i in range(20)]
+    negatives = [synthetic_word(list(rng.uniform(250, 1500, 4)), rng.uniform(0.7, 1.3), 200 + i) for i in range(20)]
+    return directory, positives, negatives
+
+
+def main(args: List[str]) -> None:
+    if len(args) == 3:
+        recordings, positives, negatives = args[0], load_dir(args[1]), load_dir(args[2])
+    else:
+        recordings, positives, negatives = synthetic_set()
+
+    spotter = WakeWordSpotter(recordings)
+    if not spotter.enabled:
+        print("No usable wake word recordings")
+        return
+    started = time.perf_counter()
+    pos_scores = [spotter.score(p) for p in positives]
+    neg_scores = [spotter.score(n) for n in negatives]
+    per_check = (time.perf_counter() - started) / (len(positives) + len(negatives))
+    print(f"{len(positives)} with / {len(negatives)} without wake word, "
+          f"{len(spotter.templates)} recordings, {per_check * 1000:.1f} ms per check")
+
+    for sensitivity in SENSITIVITIES:
+        spotter.sensitivity = sensitivity
+        for fallback in (False, True):
+            allowed = (ACCEPT, UNSURE) if fallback else (ACCEPT,)
+            false_rejects = sum(spotter.verdict(d) not in allowed for d in pos_scores)
+            false_accepts = sum(spotter.verdict(d) in allowed for d in neg_scores)
+            print(f"  sensitivity {sensitivity:4.2f} fallback {'on ' if fallback else 'off'}  "
+                  f"false rejects {false_rejects / len(pos_scores):6.1%}  "
+                  f"false accepts {false_accepts / len(neg_scores):6.1%}  "
+                  f"requests saved {len(neg_scores) - false_accepts}/{len(neg_scores)}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
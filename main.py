@@ -1,8 +1,15 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 import discord
+from discord import app_commands
 from discord.ext import commands, voice_recv
-from src.record import AudioProcessor
+from src.record import AudioProcessor, recognition_pool, speech, spotter, vad
 from src.gemini import GeminiWebSocket
+from src.sessions import GeminiSessionManager
+from src.settings import GuildSettings
+from src.cache import AnswerCache
+from src.metrics import MetricsServer, metrics
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -17,21 +24,161 @@ load_dotenv()
 
 # Voice options: puck, charon, kore, fenrin, aoede
 
-gemini_ws: GeminiWebSocket = GeminiWebSocket(
+# Input mode:
+# "text"  - Google Speech turns the question into text, supports the wake word
+# "audio" - stream the microphone audio straight to Gemini while speaking
+INPUT_MODE = "text"
+
+# Audio prebuffer before playback starts (ms). Grows automatically on gaps,
+# shrinks again while the stream is healthy.
+PREBUFFER_MS = 60
+MAX_PREBUFFER_MS = 400
+
+# Every guild gets its own Gemini session. Limit how many may be open at
+# once and close sessions that have been idle for a while (seconds).
+MAX_SESSIONS = 10
+SESSION_IDLE_TIMEOUT = 600
+
+# Keep this many sessions per voice/persona connected and set up in advance,
+# so /chat does not wait for Gemini. They count towards MAX_SESSIONS and are
+# replaced after WARM_SESSION_MAX_AGE seconds.
+WARM_SESSIONS = 0
+WARM_SESSION_MAX_AGE = 600
+
+# /voice and /persona change Nano per server, saved in this folder.
+GUILD_SETTINGS_DIR = "guild_settings"
+VOICES = ["puck", "charon", "kore", "fenrir", "aoede"]
+
+# Questions asked while Nano is still answering wait in a queue.
+# TURN_POLICY: "queue" (reject when full), "replace-latest" (a speaker's new
+# question replaces their waiting one), "drop-oldest" (make room).
+# Questions older than TURN_MAX_WAIT seconds are dropped.
+TURN_POLICY = "queue"
+MAX_PENDING_TURNS = 4
+TURN_MAX_WAIT = 15
+
+# Cache spoken answers of repeated questions (e.g. "Wer bist du?") and play
+# them again without asking Gemini. Questions about time, date, weather or
+# news are never cached. Sizes in MB, ANSWER_CACHE_TTL in seconds.
+# Gemini does not see cached questions, so follow-up questions lose that context.
+USE_ANSWER_CACHE = False
+ANSWER_CACHE_DIR = "answer_cache"
+ANSWER_CACHE_MEMORY_MB = 32
+ANSWER_CACHE_DISK_MB = 512
+ANSWER_CACHE_TTL = 24 * 3600
+
+# Per-turn latency metrics. With METRICS_PORT set, http://127.0.0.1:<port>/metrics
+# serves Prometheus histograms per stage and /stats a JSON summary.
+# LOG_TURN_TIMINGS prints one JSON line with the stage timings per turn.
+METRICS_PORT = None
+LOG_TURN_TIMINGS = False
+
+# Output encoding of Nano's answers:
+# "pcm"  - discord Opus-encodes every frame in its player thread
+# "opus" - ENCODE_WORKERS threads encode the answer while it arrives, the
+#          player thread only sends ready packets (needs libopus)
+OUTPUT_ENCODING = "pcm"
+ENCODE_WORKERS = 2
+
+# Sharding: started via `python -m src.supervisor` (options there), this
+# process is one of several workers and only runs the shards in SHARD_IDS.
+# Sessions and limits above then apply per worker, each worker keeps its
+# answer cache in ANSWER_CACHE_DIR/worker<WORKER_INDEX>.
+SHARD_IDS = os.getenv("SHARD_IDS")
+SHARD_COUNT = os.getenv("SHARD_COUNT")
+WORKER_INDEX = int(os.getenv("WORKER_INDEX", "0"))
+if os.getenv("WORKER_METRICS_PORT"):
+    METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT"))
+
+shard_ids: Optional[List[int]] = None
+if SHARD_IDS or SHARD_COUNT:
+    # Nur eins von beiden gesetzt wäre ein halber Shard-Betrieb, lieber gar nicht starten
+    try:
+        shard_ids = [int(shard) for shard in (SHARD_IDS or "").split(",")]
+        shard_count = int(SHARD_COUNT or "")
+    except ValueError:
+        raise SystemExit(f"SHARD_IDS ({SHARD_IDS!r}) and SHARD_COUNT ({SHARD_COUNT!r}) must both be set, "
+                         f"e.g. SHARD_IDS=0,1 SHARD_COUNT=4")
+    if not all(0 <= shard < shard_count for shard in shard_ids):
+        raise SystemExit(f"SHARD_IDS {SHARD_IDS} out of range for SHARD_COUNT {SHARD_COUNT}")
+
+answer_cache = AnswerCache(
+    # Jeder Worker bekommt seinen eigenen Ordner, sonst räumen sie sich gegenseitig die Dateien weg
+    directory=os.path.join(ANSWER_CACHE_DIR, f"worker{WORKER_INDEX}") if shard_ids else ANSWER_CACHE_DIR,
+    max_memory_bytes=ANSWER_CACHE_MEMORY_MB * 1024 * 1024,
+    max_disk_bytes=ANSWER_CACHE_DISK_MB * 1024 * 1024,
+    ttl=ANSWER_CACHE_TTL,
+) if USE_ANSWER_CACHE else None
+
+encode_pool = ThreadPoolExecutor(
+    max_workers=ENCODE_WORKERS,
+    thread_name_prefix="opus-encode",
+) if OUTPUT_ENCODING == "opus" else None
+
+sessions: GeminiSessionManager = GeminiSessionManager(
 # Voice options: puck, charon, kore, fenrin, aoede
     voice="charon", 
     persona="Du bist ein hilfreicher Assistent. Antworte ausschließlich auf Deutsch. Verwende niemals Englisch, auch nicht für Zahlen, Begriffe oder Namen. Alles soll deutsch sein und hast eine und du darfts nich mit emojs antworten Dein Name ist nano",
+    prebuffer_ms=PREBUFFER_MS,
+    max_prebuffer_ms=MAX_PREBUFFER_MS,
+    max_sessions=MAX_SESSIONS,
+    idle_timeout=SESSION_IDLE_TIMEOUT,
+    turn_policy=TURN_POLICY,
+    max_pending_turns=MAX_PENDING_TURNS,
+    turn_max_wait=TURN_MAX_WAIT,
+    cache=answer_cache,
+    encode_pool=encode_pool,
+    warm_sessions=WARM_SESSIONS,
+    warm_max_age=WARM_SESSION_MAX_AGE,
+    settings=GuildSettings(GUILD_SETTINGS_DIR),
 )
 
+metrics.log_turns = LOG_TURN_TIMINGS
+metrics_server = MetricsServer(metrics, port=METRICS_PORT, sources={
+    "sessions": sessions.stats,
+    "recognition": recognition_pool.stats,
+    "speech": speech.stats,
+    "vad": vad.stats,
+    "wake_word": spotter.stats if spotter else dict,
+    "gemini": lambda: {key: session.stats() for key, session in sessions.sessions.items()},
+    "speakers": lambda: {
+        vc.guild.id: vc.sink.speakers.stats()
+        for vc in bot.voice_clients if isinstance(getattr(vc, "sink", None), AudioProcessor)
+    },
+    "shards": lambda: {
+        "worker": WORKER_INDEX,
+        "shard_ids": SHARD_IDS,
+        "guilds": len(bot.guilds),
+        "latency_ms": round(bot.latency * 1000, 1),
+    },
+}) if METRICS_PORT else None
+
 intents: discord.Intents = discord.Intents.default()
 intents.message_content = True
-bot: commands.Bot = commands.Bot(command_prefix="!", intents=intents)
+if shard_ids:
+    bot: commands.Bot = commands.AutoShardedBot(
+        command_prefix="!",
+        intents=intents,
+        shard_ids=shard_ids,
+        shard_count=shard_count,
+    )
+else:
+    bot = commands.Bot(command_prefix="!", intents=intents)
 
 @bot.tree.command(name="chat")
 async def chat(interaction: discord.Interaction) -> None:
     if not interaction.user.voice:
         await interaction.response.send_message("Du musst in eine sprachkannal sein")
         return
+
+    # Verbindungsaufbau zu Gemini kann länger als 3 Sekunden dauern
+    await interaction.response.defer()
+    try:
+        gemini_ws: GeminiWebSocket = await sessions.get(interaction.guild.id)
+    except Exception as e:
+        print(f"Could not open Gemini session: {e}")
+        await interaction.followup.send("Gerade sind alle Leitungen belegt, versuch es gleich nochmal")
+        return
     
     voice_client: voice_recv.VoiceRecvClient = await interaction.user.voice.channel.connect(
         cls=voice_recv.VoiceRecvClient
@@ -40,11 +187,14 @@ async def chat(interaction: discord.Interaction) -> None:
         interaction.user, 
         interaction.channel, 
         bot, 
-        gemini_ws
+        gemini_ws,
+        input_mode=INPUT_MODE,
+        sessions=sessions,
+        guild_id=interaction.guild.id,
     )
     voice_client.listen(sink)
     
-    await interaction.response.send_message("Nano hört zu")
+    await interaction.followup.send("Nano hört zu")
 
 @bot.tree.command(name="exit")
 async def exit(interaction: discord.Interaction) -> None:
@@ -61,14 +211,37 @@ async def exit(interaction: discord.Interaction) -> None:
         return
         
     await interaction.guild.voice_client.disconnect()
+    await sessions.close(interaction.guild.id)
     await interaction.response.send_message("Ciao")
 
+@bot.tree.command(name="voice", description="Stimme von Nano auf diesem Server ändern")
+@app_commands.guild_only()
+@app_commands.default_permissions(manage_guild=True)
+@app_commands.choices(name=[app_commands.Choice(name=v, value=v) for v in VOICES + ["standard"]])
+async def set_voice(interaction: discord.Interaction, name: app_commands.Choice[str]) -> None:
+    value = None if name.value == "standard" else name.value
+    profile = sessions.configure(interaction.guild.id, voice=value)
+    await interaction.response.send_message(f"Stimme ist jetzt {profile.voice}, gilt ab der nächsten Frage")
+
+@bot.tree.command(name="persona", description="Persönlichkeit von Nano auf diesem Server ändern")
+@app_commands.guild_only()
+@app_commands.default_permissions(manage_guild=True)
+@app_commands.describe(text="Anweisung an Nano, leer lassen für die Standard-Persona")
+async def set_persona(interaction: discord.Interaction, text: Optional[str] = None) -> None:
+    sessions.configure(interaction.guild.id, persona=text)
+    message = "Neue Persona gespeichert" if text else "Standard-Persona wiederhergestellt"
+    await interaction.response.send_message(f"{message}, gilt ab der nächsten Frage")
+
 @bot.event
 async def on_ready() -> None:
     print(f'Logged in as {bot.user}')
-    await bot.tree.sync()
+    # Die Slash-Commands gelten für die ganze App, einmal synchronisieren reicht
+    if WORKER_INDEX == 0:
+        await bot.tree.sync()
     print('------')
     
-    await gemini_ws.connect()
+    sessions.start()
+    if metrics_server:
+        await metrics_server.start()
 
 bot.run(os.getenv('DISCORD_TOKEN'))
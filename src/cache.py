@@ -0,0 +1,194 @@
+import hashlib
+import mmap
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# Fragen, deren Antwort sich ändert, werden nie gecacht
+DEFAULT_EXCLUDE = (
+    "spät", "uhr", "zeit", "datum", "heute", "morgen", "gestern", "jetzt",
+    "wetter", "aktuell", "nachrichten", "news", "preis", "kurs", "live",
+)
+# Grüße, die ein Ausschlusswort enthalten, aber immer gleich beantwortet werden
+DEFAULT_ALLOW = ("guten morgen",)
+
+
+def normalize(text: str) -> str:
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+
+class AnswerCache:
+    """LRU cache of synthesized answers (24 kHz mono PCM) for repeated questions.
+
+    Entries are keyed by the normalized question plus persona and voice and
+    expire after ``ttl`` seconds. The hottest ``max_memory_bytes`` stay in
+    memory; entries pushed out of memory spill into ``directory`` (up to
+    ``max_disk_bytes``) and are served from there via mmap. Questions that
+    contain one of the ``exclude`` words are never cached, phrases in
+    ``allow`` are not checked against them ("guten morgen" is a greeting,
+    not a question about tomorrow).
+
+    A hit is played without asking Gemini, so the session never sees that
+    question and its answer. A follow-up like "und warum?" then refers to
+    whatever was asked before. Sending the question as context alone would
+    leave an unanswered user turn that Gemini answers with the next one, so
+    this trade-off is accepted: only enable the cache where questions stand
+    on their own.
+    """
+
+    def __init__(self,
+                 directory: str = "answer_cache",
+                 max_memory_bytes: int = 32 * 1024 * 1024,
+                 max_disk_bytes: int = 512 * 1024 * 1024,
+                 ttl: float = 24 * 3600.0,
+                 exclude: Iterable[str] = DEFAULT_EXCLUDE,
+                 allow: Iterable[str] = DEFAULT_ALLOW) -> None:
+        self.directory: str = directory
+        self.max_memory_bytes: int = max_memory_bytes
+        self.max_disk_bytes: int = max_disk_bytes
+        self.ttl: float = ttl
+        self.exclude: Tuple[str, ...] = tuple(normalize(word) for word in exclude)
+        self.allow: Tuple[str, ...] = tuple(normalize(phrase) for phrase in allow)
+        self.memory: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self.disk: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()
+        self.memory_bytes: int = 0
+        self.disk_bytes: int = 0
+        self.lookups: int = 0
+        self.memory_hits: int = 0
+        self.disk_hits: int = 0
+        self.excluded: int = 0
+        self.stored: int = 0
+        self.bytes_saved: int = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_disk_index()
+
+    def key_for(self, question: str, persona: str, voice: str) -> Optional[str]:
+        """Returns the cache key, or None if the question must not be cached."""
+        text = normalize(question)
+        checked = f" {text} "
+        for phrase in self.allow:
+            checked = checked.replace(f" {phrase} ", " ")
+        words = checked.split()
+        # Wortanfang reicht: "uhr" trifft auch "uhrzeit"
+        if any(w.startswith(word) for word in self.exclude for w in words):
+            self.excluded += 1
+            return None
+        return hashlib.sha1(f"{voice}\0{persona}\0{text}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[memoryview]:
+        """Returns the cached PCM or None, hand it to ``release`` once it is copied."""
+        self.lookups += 1
+        now = time.time()
+        entry = self.memory.get(key)
+        if entry is not None:
+            created, pcm = entry
+            if now - created <= self.ttl:
+                self.memory.move_to_end(key)
+                self.memory_hits += 1
+                self.bytes_saved += len(pcm)
+                return memoryview(pcm)
+            self._drop_memory(key)
+
+        disk_entry = self.disk.get(key)
+        if disk_entry is not None:
+            created, size = disk_entry
+            if now - created <= self.ttl:
+                try:
+                    with open(self._path(key), "rb") as f:
+                        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except (OSError, ValueError) as e:
+                    print(f"Answer cache read failed: {e}")
+                    self._drop_disk(key)
+                    return None
+                self.disk.move_to_end(key)
+                self.disk_hits += 1
+                self.bytes_saved += size
+                return memoryview(mapped)
+            self._drop_disk(key)
+        return None
+
+    @staticmethod
+    def release(view: memoryview) -> None:
+        """Frees a view returned by ``get`` and closes its mmap, if any."""
+        mapped = view.obj
+        view.release()
+        if isinstance(mapped, mmap.mmap):
+            mapped.close()
+
+    def put(self, key: str, pcm: bytes) -> None:
+        if not pcm or len(pcm) > self.max_memory_bytes:
+            return
+        self._drop_memory(key)
+        self._drop_disk(key)
+        self.memory[key] = (time.time(), pcm)
+        self.memory_bytes += len(pcm)
+        self.stored += 1
+        while self.memory_bytes > self.max_memory_bytes:
+            old_key, (created, old_pcm) = self.memory.popitem(last=False)
+            self.memory_bytes -= len(old_pcm)
+            self._spill(old_key, created, old_pcm)
+
+    def _spill(self, key: str, created: float, pcm: bytes) -> None:
+        if len(pcm) > self.max_disk_bytes:
+            return
+        while self.disk and self.disk_bytes + len(pcm) > self.max_disk_bytes:
+            self._drop_disk(next(iter(self.disk)))
+        try:
+            # Über eine Temp-Datei, eine noch gemappte alte Datei darf nicht abgeschnitten werden
+            tmp = self._path(key) + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(pcm)
+            os.utime(tmp, (created, created))
+            os.replace(tmp, self._path(key))
+        except OSError as e:
+            print(f"Answer cache write failed: {e}")
+            return
+        self.disk[key] = (created, len(pcm))
+        self.disk_bytes += len(pcm)
+
+    def _drop_memory(self, key: str) -> None:
+        entry = self.memory.pop(key, None)
+        if entry is not None:
+            self.memory_bytes -= len(entry[1])
+
+    def _drop_disk(self, key: str) -> None:
+        entry = self.disk.pop(key, None)
+        if entry is None:
+            return
+        self.disk_bytes -= entry[1]
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pcm")
+
+    def _load_disk_index(self) -> None:
+        """Picks up answers spilled by a previous run, oldest first."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".pcm"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, name[:-4], stat.st_size))
+        for created, key, size in sorted(entries):
+            self.disk[key] = (created, size)
+            self.disk_bytes += size
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.memory_hits + self.disk_hits
+        return {
+            "lookups": self.lookups,
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "hit_rate": round(hits / self.lookups, 3) if self.lookups else 0.0,
+            "excluded": self.excluded,
+            "stored": self.stored,
+            "bytes_saved": self.bytes_saved,
+            "memory_bytes": self.memory_bytes,
+            "disk_bytes": self.disk_bytes,
+        }
@@ -0,0 +1,67 @@
+from typing import Any, Dict
+
+# discord liefert 48 kHz stereo 16-bit
+CAPTURE_BYTES_PER_SECOND: int = 48000 * 2 * 2
+
+
+class CaptureBuffer:
+    """Collects the PCM of one utterance with a hard upper bound.
+
+    Appends go into a single growing bytearray (amortised O(1)) instead of
+    rebuilding a bytes object per packet. Once ``max_bytes`` is reached the
+    buffer reports itself full and the caller is expected to ``take()`` the
+    utterance and hand it on.
+    """
+
+    def __init__(self, max_seconds: float = 30.0) -> None:
+        self.max_bytes: int = int(max_seconds * CAPTURE_BYTES_PER_SECOND)
+        self._data: bytearray = bytearray()
+        self.bytes_captured: int = 0
+        self.utterances: int = 0
+        self.utterances_truncated: int = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __bool__(self) -> bool:
+        return bool(self._data)
+
+    @property
+    def full(self) -> bool:
+        return len(self._data) >= self.max_bytes
+
+    def append(self, pcm: bytes) -> bool:
+        """Adds a packet and returns True if the buffer is now full.
+
+        Whatever does not fit is dropped; the next packet after ``take()``
+        starts the following utterance.
+        """
+        room = self.max_bytes - len(self._data)
+        if room <= 0:
+            return True
+        if len(pcm) > room:
+            pcm = pcm[:room]
+        self._data += pcm
+        self.bytes_captured += len(pcm)
+        return len(self._data) >= self.max_bytes
+
+    def take(self) -> bytes:
+        """Returns the captured utterance and starts a new, empty one."""
+        if self.full:
+            self.utterances_truncated += 1
+        data = bytes(self._data)
+        self._data.clear()
+        if data:
+            self.utterances += 1
+        return data
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "buffered_bytes": len(self._data),
+            "bytes_captured": self.bytes_captured,
+            "utterances": self.utterances,
+            "utterances_truncated": self.utterances_truncated,
+        }
@@ -0,0 +1,109 @@
+import binascii
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import orjson
+    loads: Callable[[bytes], Any] = orjson.loads
+except ImportError:  # orjson is optional, json.loads takes bytes as well
+    loads = json.loads
+
+INLINE_DATA: bytes = b'"inlineData"'
+DATA_KEY: bytes = b'"data"'
+# Flags, for which the message still has to be parsed completely
+SLOW_MARKERS = (b'"turnComplete"', b'"interrupted"', b'"error"', b'"goAway"', b'"toolCall"')
+
+
+class ServerMessage:
+    """The parts of a BidiGenerateContent server message the bot acts on."""
+    __slots__ = ("audio", "turn_complete", "interrupted", "error")
+
+    def __init__(self) -> None:
+        self.audio: List[bytes] = []
+        self.turn_complete: bool = False
+        self.interrupted: bool = False
+        self.error: Optional[Any] = None
+
+
+class GeminiMessageDecoder:
+    """Decodes Gemini server messages with a fast path for audio chunks.
+
+    Almost every message of an answer is a single inlineData part with a few
+    kilobytes of base64 audio. Those are not parsed as JSON at all: the base64
+    payload is located with a byte search and handed to binascii straight from
+    a memoryview of the raw frame, skipping the UTF-8 decode, the JSON string
+    copy and the dict walk. Anything else (turn completion, errors, tool
+    calls) goes through a full parse with orjson if it is installed.
+    """
+
+    def __init__(self) -> None:
+        self.messages: int = 0
+        self.fast_path: int = 0
+        self.bytes_in: int = 0
+        self.audio_bytes_out: int = 0
+        self.decode_time: float = 0.0
+
+    def decode(self, raw: bytes) -> ServerMessage:
+        started = time.perf_counter()
+        if isinstance(raw, str):
+            raw = raw.encode("utf-8")
+        message = ServerMessage()
+        if not self._scan_audio(raw, message):
+            self._parse(raw, message)
+        self.messages += 1
+        self.bytes_in += len(raw)
+        self.audio_bytes_out += sum(len(a) for a in message.audio)
+        self.decode_time += time.perf_counter() - started
+        return message
+
+    def _scan_audio(self, raw: bytes, message: ServerMessage) -> bool:
+        """Fast path for a message with exactly one audio part and nothing else.
+
+        Base64 never contains a quote, so the payload ends at the next quote
+        and all JSON keys live in the short head and tail around it. Returns
+        False if the message needs a full parse.
+        """
+        pos = raw.find(INLINE_DATA)
+        if pos < 0:
+            return False
+        key = raw.find(DATA_KEY, pos)
+        colon = raw.find(b':', key + len(DATA_KEY)) if key >= 0 else -1
+        start = raw.find(b'"', colon) + 1 if colon >= 0 else 0
+        end = raw.find(b'"', start) if start > 0 else -1
+        if end < 0:
+            return False
+        head = raw[:start]
+        tail = raw[end:]
+        if INLINE_DATA in tail or any(m in head or m in tail for m in SLOW_MARKERS):
+            return False
+        if end > start:
+            # Nicht-Base64-Zeichen wie "\/" ignoriert binascii
+            message.audio.append(binascii.a2b_base64(memoryview(raw)[start:end]))
+        self.fast_path += 1
+        return True
+
+    def _parse(self, raw: bytes, message: ServerMessage) -> None:
+        response: Dict[str, Any] = loads(raw)
+        if "error" in response:
+            message.error = response["error"]
+            return
+        content = response.get("serverContent")
+        if not content:
+            return
+        for part in content.get("modelTurn", {}).get("parts", ()):
+            data = part.get("inlineData", {}).get("data")
+            if data:
+                message.audio.append(binascii.a2b_base64(data))
+        message.turn_complete = bool(content.get("turnComplete"))
+        message.interrupted = bool(content.get("interrupted"))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "messages": self.messages,
+            "fast_path": self.fast_path,
+            "mb_in": round(self.bytes_in / 1e6, 3),
+            "audio_mb_out": round(self.audio_bytes_out / 1e6, 3),
+            "decode_ms": round(self.decode_time * 1000, 1),
+            "mb_per_s": round(self.bytes_in / 1e6 / self.decode_time, 1) if self.decode_time else 0.0,
+        }
@@ -0,0 +1,95 @@
+"""Stand-ins for the discord objects AudioProcessor and GeminiWebSocket touch.
+
+Used by benchmarks.bench_replay and the tests, so both run without a bot
+token or a voice connection.
+"""
+import asyncio
+import math
+import struct
+import threading
+import time
+from typing import Any, Callable, Optional
+
+FRAME_SECONDS: float = 0.02
+PACKET_BYTES: int = 3840  # 20 ms 48 kHz stereo 16-bit
+
+
+def utterance(seconds: float = 2.0) -> bytes:
+    """48 kHz stereo 16-bit tone with a syllable-like envelope, passes the VAD."""
+    count = int(seconds * 48000)
+    samples = (
+        int(6000 * math.sin(2 * math.pi * 220 * i / 48000) * (0.5 + 0.5 * math.sin(2 * math.pi * 3 * i / 48000)))
+        for i in range(count)
+    )
+    return b"".join(struct.pack("<hh", s, s) for s in samples)
+
+
+class FakeUser:
+    def __init__(self, user_id: int) -> None:
+        self.id: int = user_id
+        self.name: str = f"user{user_id}"
+        self.display_name: str = self.name
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class FakeChannel:
+    async def send(self, message: str) -> None:
+        print(f"  channel: {message}")
+
+
+class FakeBot:
+    """The only thing AudioProcessor needs from the bot is its event loop."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.loop: asyncio.AbstractEventLoop = loop
+
+
+class FakePacket:
+    def __init__(self, ssrc: int, pcm: bytes) -> None:
+        self.ssrc: int = ssrc
+        self.pcm: bytes = pcm
+
+
+class FakeVoiceClient:
+    """Plays an AudioSource on its own thread at the 20 ms cadence of discord."""
+
+    def __init__(self) -> None:
+        self.source: Any = None
+        self.thread: Optional[threading.Thread] = None
+        self.stopped: threading.Event = threading.Event()
+        self.frames: int = 0
+        self.late_frames: int = 0
+        self.underruns: int = 0
+        self.rebuffers: int = 0
+
+    def is_playing(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def play(self, source: Any, after: Optional[Callable[[Optional[Exception]], Any]] = None) -> None:
+        self.stopped.clear()
+        self.source = source
+        self.thread = threading.Thread(target=self._run, args=(source, after), daemon=True)
+        self.thread.start()
+
+    def stop_playing(self) -> None:
+        self.stopped.set()
+
+    def _run(self, source: Any, after: Optional[Callable[[Optional[Exception]], Any]]) -> None:
+        next_frame = time.perf_counter()
+        while not self.stopped.is_set():
+            if not source.read():
+                break
+            self.frames += 1
+            next_frame += FRAME_SECONDS
+            delay = next_frame - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                self.late_frames += 1
+        self.underruns += source.stats()["underruns"]
+        self.rebuffers += source.rebuffers
+        source.cleanup()
+        if after:
+            after(None)
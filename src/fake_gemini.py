@@ -0,0 +1,152 @@
+import asyncio
+import base64
+import json
+import math
+import struct
+from typing import Any, Dict, List, Optional, Set
+from websockets.asyncio.server import Server, ServerConnection, serve
+from websockets.exceptions import ConnectionClosed
+
+
+def tone(seconds: float, rate: int = 24000, freq: float = 440.0) -> bytes:
+    """16-bit mono sine tone, stands in for the voice Gemini would send."""
+    count = int(seconds * rate)
+    return struct.pack(
+        f"<{count}h",
+        *(int(8000 * math.sin(2 * math.pi * freq * i / rate)) for i in range(count)),
+    )
+
+
+class FakeGeminiServer:
+    """Local stand-in for the BidiGenerateContent websocket.
+
+    Answers the setup message, records every client message and replies to
+    each completed user turn with ``answer_seconds`` of audio split into
+    ``chunk_bytes`` sized inlineData parts, ``chunk_delay`` seconds apart.
+    Point a GeminiWebSocket at ``server.uri`` (or set GEMINI_WS_URL) to use it.
+
+    Connection loss can be simulated with ``drop_all()`` or by setting
+    ``drop_after_chunks`` to cut the connection during the next answer.
+    With ``interrupt_on_new_turn`` a turn that arrives while an answer is
+    still being sent ends that answer with ``interrupted`` instead of
+    ``turnComplete``, like the Live API does.
+
+        python -m src.fake_gemini
+    """
+
+    def __init__(self,
+                 host: str = "127.0.0.1",
+                 port: int = 0,
+                 answer_seconds: float = 1.0,
+                 chunk_bytes: int = 9600,
+                 chunk_delay: float = 0.0,
+                 interrupt_on_new_turn: bool = False) -> None:
+        self.host: str = host
+        self.port: int = port
+        self.answer: bytes = tone(answer_seconds)
+        self.chunk_bytes: int = chunk_bytes
+        self.chunk_delay: float = chunk_delay
+        self.received: List[Dict[str, Any]] = []
+        self.audio_bytes_received: int = 0
+        self.turns: int = 0
+        self.connections: Set[ServerConnection] = set()
+        self.connects: int = 0
+        self.drop_after_chunks: Optional[int] = None
+        self.interrupt_on_new_turn: bool = interrupt_on_new_turn
+        self.interrupted: int = 0
+        self.server: Optional[Server] = None
+
+    @property
+    def uri(self) -> str:
+        return f"ws://{self.host}:{self.port}"
+
+    async def start(self) -> None:
+        self.server = await serve(self.handler, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def __aenter__(self) -> "FakeGeminiServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.stop()
+
+    async def send(self, ws: ServerConnection, msg: Dict[str, Any]) -> None:
+        # Der echte Server schickt Binär-Frames
+        await ws.send(json.dumps(msg).encode("utf-8"))
+
+    async def drop_all(self) -> None:
+        """Closes every client connection without a proper goodbye."""
+        for ws in list(self.connections):
+            ws.transport.abort()
+
+    async def handler(self, ws: ServerConnection) -> None:
+        self.connections.add(ws)
+        self.connects += 1
+        try:
+            await self.serve_client(ws)
+        except ConnectionClosed:
+            pass
+        finally:
+            self.connections.discard(ws)
+
+    async def serve_client(self, ws: ServerConnection) -> None:
+        replying: Optional[asyncio.Task] = None
+        try:
+            async for raw in ws:
+                msg: Dict[str, Any] = json.loads(raw)
+                self.received.append(msg)
+                if "setup" in msg:
+                    await self.send(ws, {"setupComplete": {}})
+                elif "realtime_input" in msg:
+                    for chunk in msg["realtime_input"].get("media_chunks", []):
+                        self.audio_bytes_received += len(base64.b64decode(chunk["data"]))
+                elif msg.get("client_content", {}).get("turn_complete"):
+                    self.turns += 1
+                    if not self.interrupt_on_new_turn:
+                        await self.reply(ws)
+                        continue
+                    if replying is not None and not replying.done():
+                        # Neue Frage mitten in der Antwort: die alte endet ohne turnComplete
+                        replying.cancel()
+                        await asyncio.gather(replying, return_exceptions=True)
+                        self.interrupted += 1
+                        await self.send(ws, {"serverContent": {"interrupted": True}})
+                    replying = asyncio.create_task(self.reply(ws))
+        finally:
+            if replying is not None:
+                replying.cancel()
+
+    async def reply(self, ws: ServerConnection) -> None:
+        drop_after, self.drop_after_chunks = self.drop_after_chunks, None
+        for index, pos in enumerate(range(0, len(self.answer), self.chunk_bytes)):
+            if index == drop_after:
+                ws.transport.abort()
+                return
+            if self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+            data = base64.b64encode(self.answer[pos:pos + self.chunk_bytes]).decode("ascii")
+            await self.send(ws, {
+                "serverContent": {
+                    "modelTurn": {
+                        "parts": [{"inlineData": {"mimeType": "audio/pcm;rate=24000", "data": data}}]
+                    }
+                }
+            })
+        await self.send(ws, {"serverContent": {"turnComplete": True}})
+
+
+async def main() -> None:
+    async with FakeGeminiServer(port=8765, chunk_delay=0.02) as server:
+        print(f"Fake Gemini listening on {server.uri}")
+        await asyncio.Future()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -2,19 +2,98 @@ import asyncio
 import os
 import base64
 import json
+import time
 import traceback
-from typing import Optional, Dict, Any
+from concurrent.futures import Executor
+from typing import Optional, Dict, Any, List
 from websockets.client import WebSocketClientProtocol
 from websockets.asyncio.client import connect
+from websockets.exceptions import ConnectionClosed
+from websockets.protocol import State
 from discord import VoiceClient
-from src.stream import QueuedStreamingPCMAudio
+from discord.opus import OpusNotLoaded
+from src.stream import OpusStreamingAudio, QueuedStreamingPCMAudio, PlayoutPolicy
+from src.turns import Turn, TurnScheduler
+from src.decode import SLOW_MARKERS, GeminiMessageDecoder, ServerMessage, loads
+from src.cache import AnswerCache
+from src.metrics import TurnTrace
+
+# Die Live API erwartet Mikrofon-Audio als 16 kHz mono 16-bit PCM
+INPUT_AUDIO_RATE: int = 16000
+DEFAULT_MODEL: str = "models/gemini-2.0-flash-exp"
+
+
+class SessionClosed(Exception):
+    """The session was closed, get a new one from the session manager."""
+
 
 class GeminiWebSocket:
-    def __init__(self, voice: str = 'aoede', persona: str = "You are a helpful assistant") -> None:
+    def __init__(self,
+                 voice: str = 'aoede',
+                 persona: str = "You are a helpful assistant",
+                 model: str = DEFAULT_MODEL,
+                 playout: Optional[PlayoutPolicy] = None,
+                 uri: Optional[str] = None,
+                 recv_timeout: float = 5.0,
+                 keepalive_interval: float = 20.0,
+                 keepalive_timeout: float = 20.0,
+                 backoff_initial: float = 0.5,
+                 backoff_max: float = 30.0,
+                 max_connect_attempts: int = 6,
+                 turn_policy: str = "queue",
+                 max_pending_turns: int = 4,
+                 turn_max_wait: float = 15.0,
+                 cache: Optional[AnswerCache] = None,
+                 encode_pool: Optional[Executor] = None) -> None:
         self.ws: Optional[WebSocketClientProtocol] = None
         self.processing: bool = False
         self.lock: asyncio.Lock = asyncio.Lock()
+        self.send_lock: asyncio.Lock = asyncio.Lock()
+        self.connect_lock: asyncio.Lock = asyncio.Lock()
+        self.supervisor_task: Optional[asyncio.Task[None]] = None
+        self.closing: bool = False
+        self.recv_timeout: float = recv_timeout
+        self.keepalive_interval: float = keepalive_interval
+        self.keepalive_timeout: float = keepalive_timeout
+        self.backoff_initial: float = backoff_initial
+        self.backoff_max: float = backoff_max
+        self.max_connect_attempts: int = max_connect_attempts
+        self.disconnected_at: Optional[float] = None
+        self.disconnects: int = 0
+        self.reconnects: int = 0
+        self.failed_connects: int = 0
+        self.disconnected_seconds: float = 0.0
+        self.replayed_turns: int = 0
+        self.scheduler: TurnScheduler = TurnScheduler(max_pending_turns, turn_policy, turn_max_wait)
+        self.turn_worker: Optional[asyncio.Task[None]] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.current_source: Optional[QueuedStreamingPCMAudio] = None
+        # Wird gesetzt, sobald discords Player mit der Quelle der laufenden Runde fertig ist
+        self.playback_done: Optional[asyncio.Event] = None
+        self.cancel_event: Optional[asyncio.Event] = None
+        self.decoder: GeminiMessageDecoder = GeminiMessageDecoder()
+        self.pending_drains: int = 0
+        self.drained_messages: int = 0
+        self.interruptions: int = 0
+        self.silenced: int = 0
+        self.total_silence_latency: float = 0.0
+        self.max_silence_latency: float = 0.0
+        self.uri: Optional[str] = uri or os.getenv('GEMINI_WS_URL')
+        self.audio_bytes_sent: int = 0
+        # Ändert sich, sobald live gestreamtes Audio verloren sein kann (neue Verbindung, Sendefehler)
+        self.stream_epoch: int = 0
+        self.failed_audio_sends: int = 0
+        self.last_used: float = time.monotonic()
         self.persona: str = persona
+        self.voice: str = voice
+        self.model: str = model
+        # Für die Metriken: kam die Session aus dem vorgewärmten Pool, und die wievielte Runde ist es?
+        self.from_pool: bool = False
+        self.turns_started: int = 0
+        self.cache: Optional[AnswerCache] = cache
+        self.playout: PlayoutPolicy = playout or PlayoutPolicy()
+        # Mit Pool wird die Antwort vorab Opus-kodiert statt im Player-Thread
+        self.encode_pool: Optional[Executor] = encode_pool
         self.config: Dict[str, Any] = {
             'generation_config': {
                 "response_modalities": ["AUDIO"],
@@ -27,19 +106,141 @@ class GeminiWebSocket:
         }
         
     async def connect(self) -> None:
+        """Connects if needed and starts supervising the connection."""
+        self.loop = asyncio.get_running_loop()
+        await self.ensure_connected()
+        if self.supervisor_task is None or self.supervisor_task.done():
+            self.supervisor_task = asyncio.create_task(self._supervise())
+
+    @property
+    def busy(self) -> bool:
+        """Answering right now or has turns waiting."""
+        return self.processing or len(self.scheduler) > 0
+
+    def is_connected(self) -> bool:
+        return self.ws is not None and self.ws.state is State.OPEN
+
+    async def ensure_connected(self) -> None:
+        """(Re)connects with exponential backoff and re-runs setup().
+
+        Raises SessionClosed once close() was called, a closed session
+        never comes back on its own.
+        """
+        async with self.connect_lock:
+            if self.closing:
+                raise SessionClosed("Gemini session was closed")
+            if self.is_connected():
+                return
+            if self.ws is not None:
+                self._mark_disconnected()
+                await self._drop_ws()
+
+            delay = self.backoff_initial
+            for attempt in range(1, self.max_connect_attempts + 1):
+                try:
+                    await self._open()
+                    # Eine neue Verbindung hat keine Reste alter Antworten
+                    self.pending_drains = 0
+                    break
+                except Exception as e:
+                    self.failed_connects += 1
+                    await self._drop_ws()
+                    if attempt == self.max_connect_attempts:
+                        raise
+                    print(f"Connecting to Gemini failed ({e}), retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, self.backoff_max)
+                    if self.closing:
+                        raise SessionClosed("Gemini session was closed")
+
+            if self.closing:
+                # close() kam während des Verbindungsaufbaus
+                await self._drop_ws()
+                raise SessionClosed("Gemini session was closed")
+            if self.disconnected_at is not None:
+                self.disconnected_seconds += time.monotonic() - self.disconnected_at
+                self.disconnected_at = None
+                self.reconnects += 1
+                print(f"Reconnected to Gemini (reconnect #{self.reconnects})")
+
+    async def _open(self) -> None:
         api_key: Optional[str] = os.getenv('GEMINI_API_KEY')
         base_url: str = "wss://generativelanguage.googleapis.com"
         endpoint: str = "/ws/google.ai.generativelanguage.v1alpha.GenerativeService.BidiGenerateContent"
-        uri: str = f"{base_url}{endpoint}?key={api_key}"
-        
-        if not self.ws:
-            self.ws = await connect(uri, additional_headers={"Content-Type": "application/json"})
-            await self.setup()
-            
+        uri: str = self.uri or f"{base_url}{endpoint}?key={api_key}"
+
+        # websockets schickt selbst Pings und schließt die Verbindung, wenn kein Pong kommt
+        self.ws = await connect(
+            uri,
+            additional_headers={"Content-Type": "application/json"},
+            ping_interval=self.keepalive_interval,
+            ping_timeout=self.keepalive_timeout,
+        )
+        self.stream_epoch += 1
+        await self.setup()
+
+    async def _drop_ws(self) -> None:
+        if self.ws:
+            try:
+                await self.ws.close()
+            except Exception:
+                pass
+            self.ws = None
+
+    def _mark_disconnected(self) -> None:
+        if self.disconnected_at is None:
+            self.disconnected_at = time.monotonic()
+            self.disconnects += 1
+            print("Gemini connection lost")
+
+    async def _supervise(self) -> None:
+        """Reconnects dropped sessions in the background while they are idle."""
+        while not self.closing:
+            await asyncio.sleep(self.keepalive_interval)
+            if self.closing or self.processing or self.is_connected():
+                continue
+            try:
+                await self.ensure_connected()
+            except Exception as e:
+                print(f"Background reconnect failed: {e}")
+
+    async def close(self) -> None:
+        self.closing = True
+        for task in (self.supervisor_task, self.turn_worker):
+            if task and not task.done():
+                task.cancel()
+        self.scheduler.clear()
+        await self._drop_ws()
+
+    def stats(self) -> Dict[str, Any]:
+        disconnected = self.disconnected_seconds
+        if self.disconnected_at is not None:
+            disconnected += time.monotonic() - self.disconnected_at
+        return {
+            "connected": self.is_connected(),
+            "disconnects": self.disconnects,
+            "reconnects": self.reconnects,
+            "failed_connects": self.failed_connects,
+            "disconnected_seconds": round(disconnected, 3),
+            "replayed_turns": self.replayed_turns,
+            "interruptions": self.interruptions,
+            "drained_messages": self.drained_messages,
+            "avg_barge_in_ms": round(self.total_silence_latency / self.silenced * 1000, 1) if self.silenced else 0.0,
+            "max_barge_in_ms": round(self.max_silence_latency * 1000, 1),
+            "audio_bytes_sent": self.audio_bytes_sent,
+            "failed_audio_sends": self.failed_audio_sends,
+            **self.scheduler.stats(),
+            "decoder": self.decoder.stats(),
+            "cache": self.cache.stats() if self.cache else None,
+        }
+
+    def touch(self) -> None:
+        self.last_used = time.monotonic()
+
     async def setup(self) -> None:
         setup_msg: Dict[str, Any] = {
             "setup": {
-                "model": f"models/gemini-2.0-flash-exp",
+                "model": self.model,
                 "generation_config": self.config["generation_config"],
                 'system_instruction': {
                     'parts': [{'text': self.persona}], #  "You are a helpful assistant"
@@ -50,62 +251,327 @@ class GeminiWebSocket:
         if self.ws:
             await self.ws.send(json.dumps(setup_msg))
             raw_response: bytes = await asyncio.wait_for(self.ws.recv(), timeout=5.0)
-            setup_response: Dict[str, Any] = json.loads(raw_response.decode("utf-8"))
+            setup_response: Dict[str, Any] = loads(raw_response)
             print(f"Setup response: {json.dumps(setup_response, indent=2)}")
         
-    async def process_text(self, text: str, voice_client: VoiceClient) -> None:
+    async def send(self, msg: Dict[str, Any]) -> None:
+        # Reihenfolge sicherstellen, wenn Audio-Chunks aus mehreren Tasks kommen
+        async with self.send_lock:
+            if self.ws:
+                await self.ws.send(json.dumps(msg))
+
+    async def send_audio(self, pcm: bytes) -> bool:
+        """Streams 16kHz mono 16-bit PCM of the user while they are still talking.
+
+        Returns False if the chunk did not reach Gemini. ``stream_epoch``
+        changes then, see live_audio_intact().
+        """
+        if not pcm:
+            return True
+        self.touch()
+        if self.is_connected():
+            try:
+                await self._send_audio_chunk(pcm)
+                return True
+            except ConnectionClosed:
+                self._mark_disconnected()
+            except Exception as e:
+                print(f"Error sending audio: {e}")
+        self.failed_audio_sends += 1
+        self.stream_epoch += 1
+        return False
+
+    async def live_audio_intact(self, epoch: int) -> bool:
+        """True if every chunk streamed with send_audio() since ``epoch`` reached Gemini."""
+        # Das Lock ist fair, wer es danach bekommt, hat alle vorher gestarteten Sendungen abgewartet
+        async with self.send_lock:
+            pass
+        return self.stream_epoch == epoch and self.is_connected()
+
+    async def _send_audio_chunk(self, pcm: bytes) -> None:
+        msg: Dict[str, Any] = {
+            "realtime_input": {
+                "media_chunks": [{
+                    "mime_type": f"audio/pcm;rate={INPUT_AUDIO_RATE}",
+                    "data": base64.b64encode(pcm).decode("ascii"),
+                }]
+            }
+        }
+        await self.send(msg)
+        self.audio_bytes_sent += len(pcm)
+
+    async def process_audio(self,
+                            voice_client: VoiceClient,
+                            speaker: Optional[Any] = None,
+                            speaker_name: Optional[str] = None,
+                            trace: Optional[TurnTrace] = None,
+                            audio: Optional[List[bytes]] = None) -> bool:
+        """Ends the user turn and plays the answer.
+
+        ``audio`` is the question as 16 kHz PCM chunks if it was not streamed
+        live with send_audio(). It is only sent once the turn is started, so
+        Gemini never hears it while it is still answering another turn.
+        """
+        msg: Dict[str, Any] = {"client_content": {"turn_complete": True}}
+        if speaker_name:
+            msg["client_content"]["turns"] = [{"role": "user", "parts": [{"text": f"({speaker_name} hat gesprochen)"}]}]
+        # Live gestreamtes Audio ist mit der Verbindung weg, nicht wiederholbar
+        return await self.schedule(Turn(msg, voice_client, speaker, replayable=audio is not None,
+                                        trace=trace, audio=audio))
+
+    async def process_text(self,
+                           text: str,
+                           voice_client: VoiceClient,
+                           speaker: Optional[Any] = None,
+                           speaker_name: Optional[str] = None,
+                           trace: Optional[TurnTrace] = None) -> bool:
+        if speaker_name:
+            # Bei mehreren Sprechern soll Gemini wissen, wem es antwortet
+            text = f"{speaker_name}: {text}"
+        msg: Dict[str, Any] = {
+            "client_content": {
+                "turn_complete": True,
+                "turns": [{"role": "user", "parts": [{"text": text}]}],
+            }
+        }
+        cache_key: Optional[str] = None
+        if self.cache:
+            cache_key = self.cache.key_for(text, self.persona, self.voice)
+        return await self.schedule(Turn(msg, voice_client, speaker, cache_key=cache_key, trace=trace))
+
+    async def schedule(self, turn: Turn) -> bool:
+        """Queues a turn and waits until it was answered (True) or dropped (False)."""
+        if self.closing:
+            raise SessionClosed("Gemini session was closed")
+        if not self.scheduler.submit(turn):
+            return False
+        if self.turn_worker is None or self.turn_worker.done():
+            self.turn_worker = asyncio.create_task(self._run_turns())
+        return await turn.done
+
+    async def _run_turns(self) -> None:
+        while True:
+            turn = await self.scheduler.next()
+            try:
+                turn.resolve(await self.run_turn(turn.msg, turn.voice_client, turn.replayable, turn.cache_key,
+                                                 turn.trace, turn.audio))
+            finally:
+                turn.resolve(False)
+
+    async def run_turn(self,
+                       msg: Dict[str, Any],
+                       voice_client: VoiceClient,
+                       replayable: bool = True,
+                       cache_key: Optional[str] = None,
+                       trace: Optional[TurnTrace] = None,
+                       audio: Optional[List[bytes]] = None) -> bool:
         async with self.lock:
-            if self.processing:
-                print("Already processing, skipping...")
-                return
-                
             self.processing = True
-            audio_queue: asyncio.Queue[Optional[bytes]] = asyncio.Queue()
-            
+            self.touch()
+            audio_source: QueuedStreamingPCMAudio = self.new_audio_source(trace)
+            self.turns_started += 1
+            if trace:
+                trace.labels["first_turn"] = self.turns_started == 1
+                trace.labels["pool_hit"] = self.from_pool
+            self.cancel_event = asyncio.Event()
+            self.current_source = audio_source
+            self.playback_done = None
+
             try:
-                msg: Dict[str, Any] = {
-                    "client_content": {
-                        "turn_complete": True,
-                        "turns": [{"role": "user", "parts": [{"text": text}]}],
-                    }
-                }
-                if self.ws:
-                    await self.ws.send(json.dumps(msg))
-                
+                if cache_key and self.cache:
+                    cached = self.cache.get(cache_key)
+                    if cached is not None:
+                        # Gleiche Frage schon beantwortet: abspielen ohne Gemini zu fragen
+                        print(f"Answer cache hit ({len(cached)} bytes)")
+                        if trace:
+                            trace.labels["cache_hit"] = True
+                            trace.mark("first_audio")
+                            trace.mark("turn_complete")
+                        try:
+                            audio_source.feed(cached)
+                        finally:
+                            # feed() kopiert in den Ringpuffer, die Datei muss nicht offen bleiben
+                            self.cache.release(cached)
+                        audio_source.finish()
+                        self._play(audio_source, voice_client)
+                        return True
+
                 while True:
+                    await self.ensure_connected()
+                    # Nur vollständige, nicht unterbrochene Antworten landen im Cache
+                    collected: Optional[List[bytes]] = [] if cache_key and self.cache else None
                     try:
-                        raw_response: bytes = await asyncio.wait_for(self.ws.recv(), timeout=5.0) if self.ws else b""
-                        response: Dict[str, Any] = json.loads(raw_response.decode("utf-8"))
-                        
-                        if "error" in response:
-                            print(f"Error in Gemini response: {response['error']}")
-                            break
-
-                        if "serverContent" in response:
-                            if "modelTurn" in response["serverContent"]:
-                                for part in response["serverContent"]["modelTurn"]["parts"]:
-                                    if "inlineData" in part:
-                                        b64data = part["inlineData"]["data"]
-                                        if not b64data:
-                                            continue
-
-                                        audio_bytes = base64.b64decode(b64data)
-                                        await audio_queue.put(audio_bytes)
-
-                                        if not voice_client.is_playing():
-                                            audio_source = QueuedStreamingPCMAudio(audio_queue)
-                                            voice_client.play(audio_source, after=lambda e: print(f"Playback finished: {e}") if e else None)
-
-                                if response["serverContent"].get("turnComplete"):
-                                    await audio_queue.put(None)
-                                    break
-                                    
-                    except asyncio.TimeoutError:
-                        print("Timeout waiting for response")
-                        break
-                        
+                        for chunk in audio or ():
+                            await self._send_audio_chunk(chunk)
+                        await self.send(msg)
+                        if trace:
+                            trace.mark("request_sent")
+                        complete = await self.receive_turn(audio_source, voice_client, collected)
+                        if complete and collected and self.cache:
+                            self.cache.put(cache_key, b"".join(collected))
+                        # Timeout oder abgebrochen zählt nicht als beantwortet
+                        return complete
+                    except ConnectionClosed:
+                        self._mark_disconnected()
+                        # Nur wiederholen, solange noch nichts abgespielt wurde
+                        if replayable and audio_source.ring.bytes_written == 0:
+                            print("Connection lost before the answer started, replaying turn")
+                            self.replayed_turns += 1
+                            replayable = False
+                            continue
+                        print("Connection lost during the answer")
+                        return False
+
+            except SessionClosed:
+                print("Gemini session was closed, turn dropped")
+                return False
             except Exception as e:
                 print(f"Error in process_text: {e}")
                 traceback.print_exc()
+                return False
             finally:
-                self.processing = False
\ No newline at end of file
+                audio_source.finish()
+                if trace and audio_source.ring.bytes_written == 0:
+                    # Nichts abgespielt, cleanup() des Players kommt nie
+                    trace.finish("no_audio")
+                # Die nächste Runde darf erst spielen, wenn diese Antwort zu Ende ist
+                await self._wait_for_playback(voice_client)
+                self.current_source = None
+                self.processing = False
+                self.touch()
+
+    def _play(self, audio_source: QueuedStreamingPCMAudio, voice_client: VoiceClient) -> None:
+        """Starts playing this turn's source, once."""
+        if self.playback_done is not None:
+            return
+        loop = asyncio.get_running_loop()
+        done = self.playback_done = asyncio.Event()
+
+        def after(error: Optional[Exception]) -> None:
+            # Läuft im Player-Thread von discord
+            if error:
+                print(f"Playback finished: {error}")
+            loop.call_soon_threadsafe(done.set)
+
+        voice_client.play(audio_source, after=after)
+
+    async def _wait_for_playback(self, voice_client: VoiceClient) -> None:
+        """Waits until the player is done with this turn's source."""
+        done = self.playback_done
+        while done is not None and not done.is_set():
+            try:
+                await asyncio.wait_for(done.wait(), timeout=1.0)
+            except asyncio.TimeoutError:
+                # Getrennt oder von außen gestoppt, ohne dass after kam
+                if not voice_client.is_playing():
+                    break
+
+    def new_audio_source(self, trace: Optional[TurnTrace] = None) -> QueuedStreamingPCMAudio:
+        if self.encode_pool is not None:
+            try:
+                return OpusStreamingAudio(self.encode_pool, policy=self.playout,
+                                          on_silenced=self._on_silenced, trace=trace)
+            except OpusNotLoaded:
+                print("libopus not found, falling back to PCM output")
+                self.encode_pool = None
+        return QueuedStreamingPCMAudio(policy=self.playout, on_silenced=self._on_silenced, trace=trace)
+
+    def interrupt(self) -> bool:
+        """Barge-in: silence the current answer and abandon its turn.
+
+        Called from the voice receive thread when the user starts speaking.
+        Buffered audio is discarded, the rest of the turn is skipped without
+        decoding and the session moves on to the next turn right away.
+        Returns False if nothing was being answered.
+        """
+        source = self.current_source
+        if source is None or source.interrupted:
+            return False
+        source.interrupt()
+        self.interruptions += 1
+        if self.loop and self.cancel_event:
+            self.loop.call_soon_threadsafe(self.cancel_event.set)
+        return True
+
+    def _on_silenced(self, latency: float) -> None:
+        # Läuft im Player-Thread von discord
+        self.silenced += 1
+        self.total_silence_latency += latency
+        self.max_silence_latency = max(self.max_silence_latency, latency)
+
+    def _ends_answer(self, raw: bytes) -> bool:
+        """True if the message is the last one of an answer (turnComplete or interrupted)."""
+        # Reine Audio-Nachrichten können kein Ende sein, die müssen nicht dekodiert werden
+        if not any(marker in raw for marker in SLOW_MARKERS):
+            return False
+        message = self.decoder.decode(raw)
+        return message.turn_complete or message.interrupted
+
+    async def receive_turn(self,
+                           audio_source: QueuedStreamingPCMAudio,
+                           voice_client: VoiceClient,
+                           collected: Optional[List[bytes]] = None) -> bool:
+        """Plays the answer as it arrives, returns True if it ran to turnComplete.
+
+        The decoded audio chunks are also appended to ``collected`` if given.
+        """
+        cancelled = asyncio.ensure_future(self.cancel_event.wait())
+        try:
+            while True:
+                recv = asyncio.ensure_future(self.ws.recv())
+                done, _ = await asyncio.wait({recv, cancelled}, timeout=self.recv_timeout, return_when=asyncio.FIRST_COMPLETED)
+                if recv not in done:
+                    recv.cancel()
+                    if cancelled in done:
+                        # Der Rest der abgebrochenen Antwort kommt noch und wird später verworfen
+                        print("Turn interrupted, skipping the rest of the answer")
+                        self.pending_drains += 1
+                        return False
+                    print("Timeout waiting for response")
+                    self.pending_drains = 0
+                    return False
+                raw_response: bytes = recv.result()
+
+                if self.pending_drains:
+                    # Reste einer abgebrochenen Antwort, reines Audio ohne base64 überspringen
+                    self.drained_messages += 1
+                    if self._ends_answer(raw_response):
+                        self.pending_drains -= 1
+                    continue
+
+                if cancelled.done():
+                    if not self._ends_answer(raw_response):
+                        self.pending_drains += 1
+                    return False
+
+                message: ServerMessage = self.decoder.decode(raw_response)
+
+                if message.error is not None:
+                    print(f"Error in Gemini response: {message.error}")
+                    return False
+
+                if message.interrupted and not message.audio:
+                    if audio_source.ring.bytes_written == 0:
+                        # Gehört noch zur vorher abgebrochenen Antwort
+                        continue
+                    print("Gemini interrupted the answer")
+                    audio_source.finish()
+                    return False
+
+                if message.audio and audio_source.trace:
+                    audio_source.trace.mark("first_audio")
+
+                for audio_bytes in message.audio:
+                    audio_source.feed(audio_bytes)
+                    if collected is not None:
+                        collected.append(audio_bytes)
+
+                    self._play(audio_source, voice_client)
+
+                if message.turn_complete:
+                    if audio_source.trace:
+                        audio_source.trace.mark("turn_complete")
+                    audio_source.finish()
+                    return not audio_source.interrupted
+        finally:
+            cancelled.cancel()
@@ -0,0 +1,290 @@
+import asyncio
+import bisect
+import itertools
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Stationen einer Runde in der Reihenfolge, in der sie normalerweise passieren
+STAGES: Tuple[str, ...] = (
+    "speaking_stop",
+    "wav_built",
+    "stt_done",
+    "wake_word",
+    "request_sent",
+    "first_audio",
+    "playback_started",
+    "turn_complete",
+    "playback_finished",
+)
+
+# Obergrenzen der Histogramm-Buckets in Sekunden
+BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS) -> None:
+        self.buckets: Tuple[float, ...] = buckets
+        self.counts: List[int] = [0] * (len(buckets) + 1)
+        self.count: int = 0
+        self.sum: float = 0.0
+        self.max: float = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket that contains the q-quantile."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"counts": list(self.counts), "count": self.count, "sum": self.sum, "max": self.max}
+
+    def merge(self, snapshot: Dict[str, Any]) -> None:
+        """Adds the observations of another histogram with the same buckets."""
+        self.counts = [a + b for a, b in zip(self.counts, snapshot["counts"])]
+        self.count += snapshot["count"]
+        self.sum += snapshot["sum"]
+        self.max = max(self.max, snapshot["max"])
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.sum / self.count * 1000, 1) if self.count else 0.0,
+            "p50_ms": round(self.quantile(0.5) * 1000, 1),
+            "p95_ms": round(self.quantile(0.95) * 1000, 1),
+            "max_ms": round(self.max * 1000, 1),
+        }
+
+
+class TurnTrace:
+    """Timestamps of one turn on its way from the user's mouth to the speaker.
+
+    ``mark`` may be called from any thread (voice receive, recognition worker,
+    event loop, discord's player). The first call for a stage wins. ``finish``
+    hands the trace to the registry exactly once.
+    """
+
+    def __init__(self, registry: "MetricsRegistry", trace_id: int, labels: Dict[str, Any]) -> None:
+        self.registry: "MetricsRegistry" = registry
+        self.id: int = trace_id
+        self.labels: Dict[str, Any] = labels
+        self.started_at: float = time.perf_counter()
+        self.marks: Dict[str, float] = {}
+        self.outcome: Optional[str] = None
+
+    def mark(self, stage: str) -> None:
+        if stage not in self.marks:
+            self.marks[stage] = time.perf_counter()
+
+    def finish(self, outcome: str = "answered") -> None:
+        if self.outcome is None:
+            self.outcome = outcome
+            self.registry.record(self)
+
+    def stages(self) -> List[Tuple[str, float]]:
+        """(stage, seconds since the previous stage) in the order they happened."""
+        result = []
+        previous = self.started_at
+        # Bei kurzen Antworten kommt turn_complete schon vor playback_started
+        for at, stage in sorted((at, stage) for stage, at in self.marks.items()):
+            result.append((stage, max(0.0, at - previous)))
+            previous = at
+        return result
+
+
+class MetricsRegistry:
+    """Collects finished turn traces into per-stage histograms.
+
+    Every stage histogram holds the time since the previous stage of the same
+    turn, so the stage with the largest numbers is the one that dominates the
+    latency. With ``log_turns`` every finished turn is also printed as one
+    JSON line.
+    """
+
+    def __init__(self, log_turns: bool = False) -> None:
+        self.log_turns: bool = log_turns
+        self.stage_seconds: Dict[str, Histogram] = {stage: Histogram() for stage in STAGES}
+        self.total_seconds: Histogram = Histogram()
+        self.first_audio_seconds: Histogram = Histogram()
+        # Erste Runde einer Session, zeigt was der vorgewärmte Pool bringt
+        self.first_turn_seconds: Histogram = Histogram()
+        self.outcomes: Dict[str, int] = {}
+        self._ids = itertools.count(1)
+        self._lock: threading.Lock = threading.Lock()
+
+    def start_trace(self, **labels: Any) -> TurnTrace:
+        return TurnTrace(self, next(self._ids), labels)
+
+    def record(self, trace: TurnTrace) -> None:
+        stages = trace.stages()
+        end = max(trace.marks.values(), default=trace.started_at)
+        with self._lock:
+            self.outcomes[trace.outcome] = self.outcomes.get(trace.outcome, 0) + 1
+            for stage, seconds in stages:
+                if stage in self.stage_seconds:
+                    self.stage_seconds[stage].observe(seconds)
+            self.total_seconds.observe(end - trace.started_at)
+            if "playback_started" in trace.marks:
+                self.first_audio_seconds.observe(trace.marks["playback_started"] - trace.started_at)
+                if trace.labels.get("first_turn"):
+                    self.first_turn_seconds.observe(trace.marks["playback_started"] - trace.started_at)
+        if self.log_turns:
+            print(json.dumps({
+                "event": "turn",
+                "id": trace.id,
+                "outcome": trace.outcome,
+                **trace.labels,
+                "total_ms": round((end - trace.started_at) * 1000, 1),
+                "stages_ms": {stage: round(seconds * 1000, 1) for stage, seconds in stages},
+            }))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "outcomes": dict(self.outcomes),
+                "total": self.total_seconds.summary(),
+                "until_playback": self.first_audio_seconds.summary(),
+                "first_turn_until_playback": self.first_turn_seconds.summary(),
+                "stages": {stage: h.summary() for stage, h in self.stage_seconds.items() if h.count},
+            }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Raw histogram data, for adding up the registries of several processes."""
+        with self._lock:
+            return {
+                "outcomes": dict(self.outcomes),
+                "total": self.total_seconds.snapshot(),
+                "until_playback": self.first_audio_seconds.snapshot(),
+                "first_turn_until_playback": self.first_turn_seconds.snapshot(),
+                "stages": {stage: h.snapshot() for stage, h in self.stage_seconds.items()},
+            }
+
+    def merge(self, snapshot: Dict[str, Any]) -> None:
+        with self._lock:
+            for outcome, count in snapshot["outcomes"].items():
+                self.outcomes[outcome] = self.outcomes.get(outcome, 0) + count
+            self.total_seconds.merge(snapshot["total"])
+            self.first_audio_seconds.merge(snapshot["until_playback"])
+            self.first_turn_seconds.merge(snapshot["first_turn_until_playback"])
+            for stage, data in snapshot["stages"].items():
+                if stage in self.stage_seconds:
+                    self.stage_seconds[stage].merge(data)
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            lines.append("# TYPE nano_turn_stage_seconds histogram")
+            for stage, histogram in self.stage_seconds.items():
+                lines.extend(_render_histogram("nano_turn_stage_seconds", histogram, f'stage="{stage}"'))
+            lines.append("# TYPE nano_turn_seconds histogram")
+            lines.extend(_render_histogram("nano_turn_seconds", self.total_seconds, ""))
+            lines.append("# TYPE nano_turn_until_playback_seconds histogram")
+            lines.extend(_render_histogram("nano_turn_until_playback_seconds", self.first_audio_seconds, ""))
+            lines.append("# TYPE nano_first_turn_until_playback_seconds histogram")
+            lines.extend(_render_histogram("nano_first_turn_until_playback_seconds", self.first_turn_seconds, ""))
+            lines.append("# TYPE nano_turns_total counter")
+            for outcome, count in self.outcomes.items():
+                lines.append(f'nano_turns_total{{outcome="{outcome}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+def _render_histogram(name: str, histogram: Histogram, label: str) -> List[str]:
+    prefix = f"{label}," if label else ""
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {histogram.count}')
+    suffix = f"{{{label}}}" if label else ""
+    lines.append(f"{name}_sum{suffix} {histogram.sum:.6f}")
+    lines.append(f"{name}_count{suffix} {histogram.count}")
+    return lines
+
+
+class MetricsServer:
+    """Tiny HTTP endpoint on the bot's event loop.
+
+    ``GET /metrics`` returns the histograms in Prometheus format, ``GET
+    /stats`` a JSON document with the turn summaries plus whatever the
+    ``sources`` callables return (session, recognition, cache stats) and
+    ``GET /snapshot`` the raw histograms for the sharding supervisor.
+    """
+
+    def __init__(self,
+                 registry: MetricsRegistry,
+                 host: str = "127.0.0.1",
+                 port: int = 9108,
+                 sources: Optional[Dict[str, Callable[[], Any]]] = None) -> None:
+        self.registry: MetricsRegistry = registry
+        self.host: str = host
+        self.port: int = port
+        self.sources: Dict[str, Callable[[], Any]] = sources or {}
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        if self.server is None:
+            self.server = await asyncio.start_server(self._handle, self.host, self.port)
+            port = self.server.sockets[0].getsockname()[1]
+            print(f"Metrics on http://{self.host}:{port}/metrics")
+
+    async def stop(self) -> None:
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def refresh(self) -> None:
+        """Called before every request, subclasses collect their data here."""
+
+    def stats(self) -> Dict[str, Any]:
+        result: Dict[str, Any] = {"turns": self.registry.stats()}
+        for name, source in self.sources.items():
+            try:
+                result[name] = source()
+            except Exception as e:
+                result[name] = {"error": str(e)}
+        return result
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request = await asyncio.wait_for(reader.readline(), timeout=5.0)
+            parts = request.decode("latin-1").split()
+            path = parts[1] if len(parts) > 1 else "/"
+            await self.refresh()
+            if path == "/metrics":
+                status, content_type, body = "200 OK", "text/plain; version=0.0.4", self.registry.render()
+            elif path == "/stats":
+                status, content_type, body = "200 OK", "application/json", json.dumps(self.stats(), default=str)
+            elif path == "/snapshot":
+                status, content_type, body = "200 OK", "application/json", json.dumps(self.registry.snapshot())
+            else:
+                status, content_type, body = "404 Not Found", "text/plain", "not found\n"
+            data = body.encode("utf-8")
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode("latin-1") + data
+            )
+            await writer.drain()
+        except Exception as e:
+            print(f"Metrics request failed: {e}")
+        finally:
+            writer.close()
+
+
+# Von record.py, gemini.py und stream.py gemeinsam genutzt
+metrics: MetricsRegistry = MetricsRegistry()
@@ -0,0 +1,107 @@
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class TokenBucket:
+    """Thread-safe token bucket with adaptive backoff.
+
+    Holds up to ``burst`` tokens and refills ``per_minute`` of them per
+    minute. ``try_acquire`` takes a token if one is there, ``wait`` blocks
+    until one is there or a deadline would be missed. When the backend
+    reports a rate limit, ``on_rate_limited`` blocks the bucket for an
+    exponentially growing backoff and halves the refill rate; every success
+    afterwards resets the backoff and lets the rate creep back up to
+    ``per_minute``.
+    """
+
+    def __init__(self,
+                 per_minute: float = 60.0,
+                 burst: int = 5,
+                 backoff_initial: float = 2.0,
+                 backoff_max: float = 60.0,
+                 min_per_minute: float = 1.0) -> None:
+        self.max_rate: float = per_minute / 60.0
+        self.rate: float = self.max_rate
+        self.min_rate: float = min(min_per_minute / 60.0, self.max_rate)
+        self.burst: int = burst
+        self.backoff_initial: float = backoff_initial
+        self.backoff_max: float = backoff_max
+        self.backoff: float = 0.0
+        self.tokens: float = float(burst)
+        self.refilled_at: float = time.monotonic()
+        self.blocked_until: float = 0.0
+        self._cond: threading.Condition = threading.Condition()
+        self.granted: int = 0
+        self.denied: int = 0
+        self.rate_limited: int = 0
+        self.total_wait: float = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+
+    def _ready_in(self, now: float) -> float:
+        """Seconds until a token can be taken, 0 if right now."""
+        self._refill(now)
+        wait = max(0.0, self.blocked_until - now)
+        if self.tokens < 1.0:
+            wait = max(wait, (1.0 - self.tokens) / self.rate)
+        return wait
+
+    def try_acquire(self) -> bool:
+        with self._cond:
+            if self._ready_in(time.monotonic()) > 0:
+                self.denied += 1
+                return False
+            self.tokens -= 1.0
+            self.granted += 1
+            return True
+
+    def wait(self, deadline: Optional[float] = None) -> bool:
+        """Waits until a token is available without taking it.
+
+        Returns False right away if that will not happen before the monotonic
+        ``deadline``. Another thread may still take the token first, callers
+        loop over ``try_acquire`` and ``wait``.
+        """
+        started = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                wait = self._ready_in(now)
+                if wait <= 0 or (deadline is not None and now + wait > deadline):
+                    self.total_wait += now - started
+                    return wait <= 0
+                self._cond.wait(wait)
+
+    def on_rate_limited(self) -> None:
+        with self._cond:
+            self.rate_limited += 1
+            self.backoff = min(self.backoff_max, self.backoff * 2 if self.backoff else self.backoff_initial)
+            self.blocked_until = max(self.blocked_until, time.monotonic() + self.backoff)
+            self._refill(time.monotonic())
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+            print(f"Rate limited, backing off {self.backoff:.1f}s at {self.rate * 60:.0f} requests/minute")
+
+    def on_success(self) -> None:
+        with self._cond:
+            self.backoff = 0.0
+            if self.rate < self.max_rate:
+                self._refill(time.monotonic())
+                # Langsam wieder hochfahren, eine Anfrage pro Minute mehr je Erfolg
+                self.rate = min(self.max_rate, self.rate + 1.0 / 60.0)
+                self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "granted": self.granted,
+                "denied": self.denied,
+                "rate_limited": self.rate_limited,
+                "per_minute": round(self.rate * 60, 1),
+                "backoff_s": self.backoff,
+                "blocked_for_s": round(max(0.0, self.blocked_until - time.monotonic()), 1),
+                "total_wait_s": round(self.total_wait, 3),
+            }
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+import time
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+T = TypeVar("T")
+
+
+class RecognitionPool:
+    """Runs speech recognition jobs off the voice receive thread.
+
+    ``submit`` only books the job and returns immediately. WAV encoding and
+    the blocking recognition request run on a bounded thread pool, and the
+    result is handed to a coroutine on the bot event loop. When more than
+    ``max_pending`` jobs are waiting new ones are rejected instead of piling
+    up behind a slow backend.
+    """
+
+    def __init__(self, max_workers: int = 4, max_pending: int = 16) -> None:
+        self.max_workers: int = max_workers
+        self.max_pending: int = max_pending
+        self.executor: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="recognition"
+        )
+        self._lock: threading.Lock = threading.Lock()
+        self.pending: int = 0
+        self.running: int = 0
+        self.completed: int = 0
+        self.failed: int = 0
+        self.rejected: int = 0
+        self.total_wait: float = 0.0
+        self.max_wait: float = 0.0
+        self.total_run: float = 0.0
+        self.max_run: float = 0.0
+
+    def submit(self,
+               job: Callable[[], T],
+               on_done: Callable[[T], Awaitable[None]],
+               loop: asyncio.AbstractEventLoop) -> bool:
+        """Queues ``job`` and schedules ``on_done(result)`` on ``loop``.
+
+        Returns False if the queue is full and the job was dropped.
+        """
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                print(f"Recognition queue full ({self.pending} waiting), dropping utterance")
+                return False
+            self.pending += 1
+        queued_at = time.perf_counter()
+
+        def run() -> T:
+            started_at = time.perf_counter()
+            with self._lock:
+                self.pending -= 1
+                self.running += 1
+                wait = started_at - queued_at
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+            try:
+                return job()
+            finally:
+                elapsed = time.perf_counter() - started_at
+                with self._lock:
+                    self.running -= 1
+                    self.total_run += elapsed
+                    self.max_run = max(self.max_run, elapsed)
+
+        def deliver(future: Future) -> None:
+            try:
+                result = future.result()
+            except Exception as e:
+                with self._lock:
+                    self.failed += 1
+                print(f"Recognition job failed: {e}")
+                traceback.print_exc()
+                return
+            with self._lock:
+                self.completed += 1
+            asyncio.run_coroutine_threadsafe(on_done(result), loop)
+
+        self.executor.submit(run).add_done_callback(deliver)
+        return True
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            finished = self.completed + self.failed
+            return {
+                "queue_depth": self.pending,
+                "running": self.running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(self.total_wait / finished * 1000, 1) if finished else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 1),
+                "avg_run_ms": round(self.total_run / finished * 1000, 1) if finished else 0.0,
+                "max_run_ms": round(self.max_run * 1000, 1),
+            }
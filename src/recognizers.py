@@ -0,0 +1,172 @@
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Type
+import speech_recognition as sr
+from src.ratelimit import TokenBucket
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from faster_whisper import WhisperModel
+except ImportError:  # nur für den lokalen Whisper-Erkenner nötig
+    WhisperModel = None
+
+# Ergebnisse, die kein erkannter Text sind
+NOT_UNDERSTOOD = "could_not_understand"
+RATE_LIMIT = "rate_limit"
+SERVICE_ERROR = "service_error"
+ERROR = "error"
+
+
+class RateLimited(Exception):
+    """The backend refused the request because of its rate limit."""
+
+
+class RecognizerBackend(ABC):
+    """Turns an utterance into text. Returns "" if nothing was understood."""
+    name: str = "base"
+
+    @abstractmethod
+    def recognize(self, audio: sr.AudioData) -> str:
+        ...
+
+
+class GoogleSpeechBackend(RecognizerBackend):
+    """The free Google Web Speech API bundled with SpeechRecognition."""
+    name = "google"
+
+    def __init__(self, language: str = "de-DE") -> None:
+        self.language: str = language
+        self.recognizer: sr.Recognizer = sr.Recognizer()
+
+    def recognize(self, audio: sr.AudioData) -> str:
+        try:
+            return self.recognizer.recognize_google(audio, language=self.language)
+        except sr.UnknownValueError:
+            return ""
+        except sr.RequestError as e:
+            text = str(e).lower()
+            if "429" in text or "rate limit" in text or "too many requests" in text:
+                raise RateLimited(str(e)) from e
+            raise
+
+
+class WhisperBackend(RecognizerBackend):
+    """Local recognition with faster-whisper, no request limits.
+
+    The model is loaded once and shared by all recognition workers; CPU
+    inference is serialised because the model is not thread-safe.
+    """
+    name = "whisper"
+
+    def __init__(self, model: str = "base", language: str = "de") -> None:
+        if WhisperModel is None or np is None:
+            raise RuntimeError("The whisper recognizer requires faster-whisper and numpy")
+        self.language: str = language
+        self.model: Any = WhisperModel(model, device="cpu", compute_type="int8")
+        self._lock: threading.Lock = threading.Lock()
+
+    def recognize(self, audio: sr.AudioData) -> str:
+        pcm = audio.get_raw_data(convert_rate=16000, convert_width=2)
+        samples = np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+        with self._lock:
+            segments, _ = self.model.transcribe(samples, language=self.language)
+            return " ".join(segment.text.strip() for segment in segments).strip()
+
+
+BACKENDS: Dict[str, Type[RecognizerBackend]] = {
+    GoogleSpeechBackend.name: GoogleSpeechBackend,
+    WhisperBackend.name: WhisperBackend,
+}
+
+
+def make_backend(name: str) -> RecognizerBackend:
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown recognizer: {name}") from None
+
+
+class SpeechRecognizer:
+    """Rate limited front for a recognition backend with optional overflow.
+
+    All AudioProcessors share one instance, so the ``limiter`` budget is
+    process-wide. Requests wait for a token until their deadline instead of
+    failing; a 429 from the backend triggers the limiter's backoff and the
+    request is retried. If an ``overflow`` backend is configured (e.g. a local
+    recognizer), requests that would have to wait go there instead.
+    """
+
+    def __init__(self,
+                 primary: RecognizerBackend,
+                 limiter: TokenBucket,
+                 overflow: Optional[RecognizerBackend] = None) -> None:
+        self.primary: RecognizerBackend = primary
+        self.limiter: TokenBucket = limiter
+        self.overflow: Optional[RecognizerBackend] = overflow
+        self._lock: threading.Lock = threading.Lock()
+        self.requests: int = 0
+        self.retries: int = 0
+        self.overflowed: int = 0
+        self.expired: int = 0
+        self.failed: int = 0
+
+    def wait_ready(self, deadline: float) -> None:
+        """Blocks until a request could go out now (or the deadline passed)."""
+        if self.overflow is None:
+            self.limiter.wait(deadline)
+
+    def recognize(self, audio: sr.AudioData, deadline: float) -> str:
+        while True:
+            if self.limiter.try_acquire():
+                self._count("requests")
+                try:
+                    text = self.primary.recognize(audio)
+                except RateLimited as e:
+                    print(f"{self.primary.name} rate limit: {e}")
+                    self.limiter.on_rate_limited()
+                    self._count("retries")
+                    continue
+                except sr.RequestError as e:
+                    print(f"Could not request results from speech recognition service; {e}")
+                    self._count("failed")
+                    return SERVICE_ERROR
+                except Exception as e:
+                    print(f"Error in speech recognition: {e}")
+                    self._count("failed")
+                    return ERROR
+                self.limiter.on_success()
+                return text or NOT_UNDERSTOOD
+
+            if self.overflow is not None:
+                self._count("overflowed")
+                try:
+                    return self.overflow.recognize(audio) or NOT_UNDERSTOOD
+                except Exception as e:
+                    print(f"Error in {self.overflow.name} speech recognition: {e}")
+                    self._count("failed")
+                    return ERROR
+
+            if not self.limiter.wait(deadline):
+                self._count("expired")
+                return RATE_LIMIT
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": self.primary.name,
+                "overflow_backend": self.overflow.name if self.overflow else None,
+                "requests": self.requests,
+                "retries": self.retries,
+                "overflowed": self.overflowed,
+                "expired": self.expired,
+                "failed": self.failed,
+                "limiter": self.limiter.stats(),
+            }
@@ -1,151 +1,399 @@
+import os
+import time
 import traceback
 import discord
 import asyncio
 import speech_recognition as sr
+from typing import Hashable, List, Optional
 from discord.ext import commands, voice_recv
-from src.gemini import GeminiWebSocket
+from src.gemini import GeminiWebSocket, INPUT_AUDIO_RATE, SessionClosed
+from src.metrics import TurnTrace, metrics
+from src.ratelimit import TokenBucket
+from src.recognition import RecognitionPool
+from src.recognizers import NOT_UNDERSTOOD, SpeechRecognizer, make_backend
+from src.resample import Downsampler
+from src.sessions import GeminiSessionManager
+from src.speakers import PendingUtterance, Speaker, SpeakerTable
+from src.vad import EnergyVAD
+from src.wakeword import WakeWordSpotter
 
 # ---- HIER EINSTELLEN ----
 WAKE_WORD = "nano"    # dein gewünschtes Wake-Word, z.B. "gemini", "marvin", "bot"
 USE_WAKE_WORD = True  # Wenn False, antwortet der Bot IMMER, egal ob Wake-Word gesagt wurde
+MAX_UTTERANCE_SECONDS = 30.0  # Längere Aufnahmen werden hier abgeschnitten und sofort erkannt
+RECOGNITION_WORKERS = 4       # Wie viele Spracherkennungen gleichzeitig laufen dürfen
+RECOGNITION_MAX_PENDING = 16  # Weitere Aufnahmen werden verworfen, solange so viele warten
+USE_VAD = True                # Stille vorne/hinten abschneiden, reine Geräusche gar nicht erst hochladen
+SPLIT_PHRASES = False         # Lange Aufnahmen an Pausen in einzelne Sätze teilen
+RECOGNITION_SAMPLE_RATE = 16000  # Spracherkennung braucht nicht mehr als 16 kHz mono
+STREAM_CHUNK_MS = 100         # Im Audio-Modus: so viel Audio pro realtime_input-Nachricht
+MULTI_SPEAKER = False         # Wenn True, hört der Bot allen im Kanal zu, nicht nur dem /chat-Aufrufer
+MAX_SPEAKERS = 4              # So vielen Leuten gleichzeitig zuhören (nur mit MULTI_SPEAKER)
+SPEAKER_TURNS_PER_MINUTE = 6  # Höchstens so viele Fragen pro Person und Minute (nur mit MULTI_SPEAKER)
+WAKE_WORD_SPOTTING = False    # Wake-Word schon lokal erkennen, nur dann geht die Aufnahme zu Google
+WAKE_WORD_RECORDINGS = "wakeword"  # Ordner mit WAV-Aufnahmen vom Wake-Word (je mehr Leute, desto besser)
+WAKE_WORD_SENSITIVITY = 0.5   # Höher = nimmt mehr an (weniger verpasste, mehr unnötige Anfragen)
+WAKE_WORD_FALLBACK = True     # Bei unsicheren Treffern trotzdem Google fragen
+RECOGNIZER = "google"         # "google" oder "whisper" (lokal, braucht faster-whisper)
+OVERFLOW_RECOGNIZER = None    # z.B. "whisper": übernimmt, wenn Google gerade gedrosselt ist
+RECOGNITION_REQUESTS_PER_MINUTE = 50  # Für alle Server zusammen, wird bei 429 automatisch gesenkt
+RECOGNITION_DEADLINE = 10.0   # So lange darf eine Aufnahme auf die Erkennung warten, dann wird sie verworfen
+COALESCE_SECONDS = 1.0        # Kurze Pause? Dann wird das Folgestück an die wartende Aufnahme angehängt
+BARGE_IN_SECONDS = 0.6        # Mit MULTI_SPEAKER im Audio-Modus: so lange muss jemand sprechen, bevor Nano unterbrochen wird
 # -------------------------
 
-recognizer = sr.Recognizer()
+# discord liefert 48 kHz stereo 16-bit, also 4 Bytes pro Frame
+SAMPLE_RATE = 48000
+SAMPLE_WIDTH = 4
 
-def convert_audio_to_text_using_google_speech(audio: sr.AudioData) -> str:
+speech = SpeechRecognizer(
+    make_backend(RECOGNIZER),
+    # Im Shard-Betrieb teilen sich alle Worker-Prozesse das Budget
+    TokenBucket(per_minute=RECOGNITION_REQUESTS_PER_MINUTE / int(os.getenv("WORKER_COUNT", "1"))),
+    make_backend(OVERFLOW_RECOGNIZER) if OVERFLOW_RECOGNIZER else None,
+)
+vad = EnergyVAD(rate=SAMPLE_RATE, channels=2)
+stream_vad = EnergyVAD(rate=INPUT_AUDIO_RATE, channels=1)
+recognition_pool = RecognitionPool(max_workers=RECOGNITION_WORKERS, max_pending=RECOGNITION_MAX_PENDING)
+spotter = WakeWordSpotter(
+    template_dir=WAKE_WORD_RECORDINGS,
+    sensitivity=WAKE_WORD_SENSITIVITY,
+    fallback=WAKE_WORD_FALLBACK,
+) if USE_WAKE_WORD and WAKE_WORD_SPOTTING else None
+
+def convert_audio_to_text(audio: sr.AudioData, deadline: float) -> str:
     print("Converting audio to text...")
-    try:
-        command_text: str = recognizer.recognize_google(audio, language="de-DE")
-        return command_text.lower()
-    except sr.UnknownValueError:
+    result = speech.recognize(audio, deadline)
+    if result == NOT_UNDERSTOOD:
         print("Speech recognition could not understand the audio")
-        return "could_not_understand"
-    except sr.RequestError as e:
-        print(f"Could not request results from speech recognition service; {e}")
-        # Rate Limit erkennen!
-        if "429" in str(e) or "rate limit" in str(e).lower() or "too many requests" in str(e).lower():
-            return "rate_limit"
-        return "service_error"
-    except Exception as e:
-        print(f"Error in speech recognition: {e}")
-        return "error"
+    # Fehlercodes sind schon klein geschrieben
+    return result.lower()
 
 class AudioProcessor(voice_recv.AudioSink):
     def __init__(self,
                  user: discord.User,
                  channel: discord.TextChannel,
                  bot: commands.Bot,
-                 gemini_ws: GeminiWebSocket) -> None:
+                 gemini_ws: GeminiWebSocket,
+                 input_mode: str = "text",
+                 multi_speaker: bool = MULTI_SPEAKER,
+                 sessions: Optional[GeminiSessionManager] = None,
+                 guild_id: Optional[Hashable] = None) -> None:
         super().__init__()
-        self.buffer: bytes = b""
+        if input_mode not in ("text", "audio"):
+            raise ValueError(f"Unknown input mode: {input_mode}")
+        # "text": Google Speech -> Text an Gemini, "audio": Audio direkt an Gemini streamen
+        self.input_mode: str = input_mode
+        self.multi_speaker: bool = multi_speaker
+        self.speakers: SpeakerTable = SpeakerTable(
+            max_speakers=MAX_SPEAKERS if multi_speaker else 1,
+            max_utterance_seconds=MAX_UTTERANCE_SECONDS,
+            stream_rate=INPUT_AUDIO_RATE,
+            # Allein im Kanal gibt es niemanden, vor dem die anderen geschützt werden müssten
+            turns_per_minute=SPEAKER_TURNS_PER_MINUTE if multi_speaker else None,
+        )
+        # Im Audio-Modus gibt es nur einen Eingabestrom pro Session, einer spricht zur Zeit
+        self.streaming_speaker: Optional[Speaker] = None
         self.target_user: discord.User = user
-        self.recording_active: bool = False
         self.channel: discord.TextChannel = channel
         self.bot: commands.Bot = bot
         self.gemini_ws: GeminiWebSocket = gemini_ws
+        # Mit Manager wird die Session vor jeder Frage neu geholt, er kann die alte geschlossen haben
+        self.sessions: Optional[GeminiSessionManager] = sessions
+        self.guild_id: Optional[Hashable] = guild_id
         self.known_ssrcs = set()
         self._voice_client = None  # eigener Name, um Konflikte zu vermeiden
 
     def wants_opus(self) -> bool:
         return False
 
+    def _speaker(self, user) -> Optional[Speaker]:
+        if user is None:
+            return None
+        if not self.multi_speaker and user != self.target_user:
+            return None
+        return self.speakers.get(user)
+
     def write(self, user, audio_data):
         if hasattr(audio_data, 'ssrc') and audio_data.ssrc not in self.known_ssrcs:
             self.known_ssrcs.add(audio_data.ssrc)
             print(f"Registered new SSRC: {audio_data.ssrc} from user {user}")
-        if self.recording_active and audio_data.pcm:
-            if user == self.target_user:
-                self.buffer += audio_data.pcm
+        if not audio_data.pcm or user is None:
+            return
+        speaker = self.speakers.speakers.get(user.id)
+        if speaker is None or not speaker.recording:
+            return
+        if self.input_mode == "audio":
+            if self.streaming_speaker is speaker:
+                self._stream_packet(speaker, audio_data.pcm)
+        elif speaker.capture.append(audio_data.pcm):
+            print(f"Maximum utterance length of {MAX_UTTERANCE_SECONDS}s reached, processing now")
+            self._handle_utterance(speaker, speaker.capture.take())
 
     @voice_recv.AudioSink.listener()
     def on_voice_member_speaking_start(self, member: discord.Member) -> None:
         print(f"User {member} started speaking.")
-        if member == self.target_user:
-            if self._voice_client and self._voice_client.is_playing():
-                self._voice_client.stop_playing()
-            self.recording_active = True
+        speaker = self._speaker(member)
+        if speaker is None:
+            return
+        if self.input_mode == "audio":
+            if self.streaming_speaker is not None and self.streaming_speaker is not speaker:
+                print(f"{speaker.name} ignored, {self.streaming_speaker.name} is already speaking")
+                return
+            self.streaming_speaker = speaker
+            # Live nur in eine freie Session, sonst hört Gemini mitten in eine andere Antwort hinein
+            session = self.gemini_ws
+            speaker.stream_session = session if not session.busy and not session.closing else None
+            speaker.stream_epoch = session.stream_epoch
+            speaker.stream_audio = []
+        # Mit mehreren Leuten im Kanal gilt nicht jedes Geräusch dem Bot, da wird erst später unterbrochen
+        if not self.multi_speaker:
+            self._barge_in()
+        speaker.barged_in = False
+        speaker.last_active = time.monotonic()
+        speaker.recording = True
 
     @voice_recv.AudioSink.listener()
     def on_voice_member_speaking_stop(self, member: discord.Member) -> None:
         print(f"User {member.name} stopped speaking.")
-        if member == self.target_user:
-            self.recording_active = False
+        speaker = self.speakers.speakers.get(member.id)
+        if speaker is None or not speaker.recording:
+            return
+        speaker.recording = False
+        speaker.last_active = time.monotonic()
+
+        if self.input_mode == "audio":
+            if self.streaming_speaker is speaker:
+                self._finish_stream(speaker)
+                self.streaming_speaker = None
+            return
+        self._handle_utterance(speaker, speaker.capture.take())
+
+    async def _session(self) -> GeminiWebSocket:
+        """The guild's current session, re-acquired from the manager before every turn."""
+        if self.sessions is not None:
+            if self._voice_client is not None and not self._voice_client.is_connected():
+                # Nach /exit keine neue Session mehr aufmachen
+                raise SessionClosed("Voice client is disconnected")
+            self.gemini_ws = await self.sessions.get(self.guild_id)
+        return self.gemini_ws
+
+    def _barge_in(self) -> None:
+        """Cancels the running answer so the new question is answered right away."""
+        self.gemini_ws.interrupt()
+        if self._voice_client and self._voice_client.is_playing():
+            self._voice_client.stop_playing()
+
+    def _speech_seconds(self, speaker: Speaker) -> float:
+        """Speech the VAD finds in the last two BARGE_IN_SECONDS of the stream."""
+        chunks = max(1, int(2 * BARGE_IN_SECONDS * 1000 / STREAM_CHUNK_MS))
+        frames = stream_vad.speech_frames(b"".join(speaker.stream_audio[-chunks:]))
+        return sum(frames) * stream_vad.frame_samples / INPUT_AUDIO_RATE
+
+    def _speaker_name(self, speaker: Speaker) -> Optional[str]:
+        # Nur bei mehreren Sprechern muss Gemini wissen, wer gefragt hat
+        return speaker.name if self.multi_speaker else None
+
+    def _stream_packet(self, speaker: Speaker, pcm: bytes) -> None:
+        speaker.stream_chunk += speaker.downsampler.convert(pcm)
+        if len(speaker.stream_chunk) >= INPUT_AUDIO_RATE * 2 * STREAM_CHUNK_MS // 1000:
+            self._flush_stream(speaker)
+
+    def _flush_stream(self, speaker: Speaker) -> None:
+        if not speaker.stream_chunk:
+            return
+        chunk = bytes(speaker.stream_chunk)
+        speaker.stream_chunk.clear()
+        if speaker.streamed_bytes + len(chunk) > speaker.max_stream_bytes:
+            return
+        speaker.streamed_bytes += len(chunk)
+        # Aufheben, falls die Frage warten muss oder die Session bis dahin ersetzt wurde
+        speaker.stream_audio.append(chunk)
+        if speaker.stream_session is not None and speaker.stream_session.stream_epoch != speaker.stream_epoch:
+            # Ein Stück kam nicht an, der Rest geht nicht mehr live raus, sondern alles mit der Runde
+            speaker.stream_session = None
+        if speaker.stream_session is not None:
+            asyncio.run_coroutine_threadsafe(speaker.stream_session.send_audio(chunk), self.bot.loop)
+        elif (self.multi_speaker and not speaker.barged_in and self.gemini_ws.busy
+              and self._speech_seconds(speaker) >= BARGE_IN_SECONDS):
+            # Lange genug wirklich gesprochen, das ist eine Frage und kein Räuspern
+            speaker.barged_in = True
+            self._barge_in()
+
+    def _finish_stream(self, speaker: Speaker) -> None:
+        self._flush_stream(speaker)
+        speaker.downsampler.reset()
+        audio_length = speaker.streamed_bytes / (INPUT_AUDIO_RATE * 2)
+        audio, live_session, live_epoch = speaker.stream_audio, speaker.stream_session, speaker.stream_epoch
+        speaker.streamed_bytes = 0
+        speaker.stream_audio = []
+        speaker.stream_session = None
+        if audio_length < 0.3:
+            print("Audio too short - likely not a complete word")
+            return
+        # Hier geht die Frage an Gemini, erst jetzt zählt sie
+        if not speaker.allow_turn():
+            print(f"{speaker.name} asks too often, not answering")
+            return
+        print(f"Captured {audio_length:.1f}s of audio from {speaker.name}, waiting for Gemini")
+        trace = metrics.start_trace(mode="audio", speaker=speaker.user.id)
+        trace.mark("speaking_stop")
+        asyncio.run_coroutine_threadsafe(self._answer_stream(speaker, trace, audio, live_session, live_epoch),
+                                         self.bot.loop)
+
+    async def _answer_stream(self,
+                             speaker: Speaker,
+                             trace: TurnTrace,
+                             audio: List[bytes],
+                             live_session: Optional[GeminiWebSocket],
+                             live_epoch: int) -> None:
+        try:
+            session = await self._session()
+        except Exception as e:
+            print(f"Keine Gemini-Session für die Frage: {e}")
+            trace.finish("no_session")
+            return
+        # Schon vollständig live bei dieser Session angekommen, sonst geht das Audio erst mit der Runde raus
+        pending: Optional[List[bytes]] = audio
+        if session is live_session and await session.live_audio_intact(live_epoch):
+            pending = None
+        if not await session.process_audio(self._voice_client, speaker=speaker.user.id,
+                                           speaker_name=self._speaker_name(speaker), trace=trace,
+                                           audio=pending):
+            print("Gestreamte Frage wurde nicht beantwortet")
+
+    def _handle_utterance(self, speaker: Speaker, pcm: bytes) -> None:
+        """Runs on the voice receive thread, so only hand the audio to the pool."""
+        if not pcm:
+            return
+        print("Audio capture stopped")
+        audio_length = len(pcm) / (SAMPLE_RATE * SAMPLE_WIDTH)
+        if audio_length < 0.3:
+            print("Audio too short - likely not a complete word")
+            return
+        if speaker.coalesce(pcm, audio_length, COALESCE_SECONDS):
+            print(f"Appended {audio_length:.1f}s to the waiting utterance of {speaker.name}")
+            return
+        trace = metrics.start_trace(mode="text", speaker=speaker.user.id)
+        trace.mark("speaking_stop")
+        pending = speaker.queue_utterance(pcm, trace, time.monotonic() + RECOGNITION_DEADLINE)
+        if not recognition_pool.submit(lambda: self._recognize(speaker, pending),
+                                       lambda text: self._on_transcript(text, speaker, trace), self.bot.loop):
+            speaker.take(pending)
+            trace.finish("recognition_busy")
+
+    def _recognize(self, speaker: Speaker, pending: PendingUtterance) -> str:
+        """Runs on a recognition worker thread."""
+        # Solange gedrosselt wird, dürfen noch Folgestücke angehängt werden
+        speech.wait_ready(pending.deadline)
+        pcm = speaker.take(pending)
+        try:
+            return self._transcribe(pcm, pending.trace, pending.deadline)
+        finally:
+            pending.trace.mark("stt_done")
+
+    def _transcribe(self, pcm: bytes, trace: TurnTrace, deadline: float) -> str:
+        if not USE_VAD:
+            if spotter and not spotter.should_upload(pcm):
+                return "no_wake_word"
+            audio = self._to_audio_data(pcm)
+            trace.mark("wav_built")
+            return convert_audio_to_text(audio, deadline)
+
+        phrases = vad.split(pcm) if SPLIT_PHRASES else [vad.trim(pcm)]
+        phrases = [p for p in phrases if p]
+        if not phrases:
+            print(f"No words captured - audio appears to be silence ({vad.stats()})")
+            return ""
+        # Das Wake-Word steht am Anfang des ersten Satzes
+        if spotter and not spotter.should_upload(phrases[0]):
+            return "no_wake_word"
+
+        texts = []
+        for phrase in phrases:
+            audio = self._to_audio_data(phrase)
+            trace.mark("wav_built")
+            result = convert_audio_to_text(audio, deadline)
+            if result in ["rate_limit", "service_error", "error"]:
+                return result
+            if result != "could_not_understand":
+                texts.append(result)
+        return " ".join(texts) if texts else "could_not_understand"
+
+    def _to_audio_data(self, pcm: bytes) -> sr.AudioData:
+        """Downmixes 48kHz stereo to mono at RECOGNITION_SAMPLE_RATE for upload."""
+        mono = Downsampler(RECOGNITION_SAMPLE_RATE).convert(pcm)
+        return sr.AudioData(mono, RECOGNITION_SAMPLE_RATE, 2)
+
+    async def _on_transcript(self, result: str, speaker: Speaker, trace: TurnTrace) -> None:
+        """Runs on the bot event loop once recognition has finished."""
+        if not result:
+            trace.finish("silence")
+            return
+        if result == "no_wake_word":
+            print(f"Wake-Word '{WAKE_WORD}' lokal nicht erkannt, nichts an Google geschickt")
+            trace.finish("wake_word_gated")
+            return
+        try:
+            # Fehlerbehandlung:
+            if result in ["rate_limit", "service_error", "error"]:
+                if result == "rate_limit":
+                    message = "Google Speech API: Rate Limit erreicht. Bitte warte einen Moment, bevor du es erneut versuchst."
+                elif result == "service_error":
+                    message = "Probleme mit dem Sprachservice. Bitte später erneut versuchen."
+                else:
+                    message = "Etwas ist schiefgelaufen. Ich bin bereit zuzuhören."
+                trace.finish(result)
+                try:
+                    await self.channel.send(message)
+                except Exception as e:
+                    print(f"Fehler beim senden der nachricht: {e}")
+                return
+            # Kein "Ich konnte dich nicht verstehen." mehr!
+
+            print(f"Text: {result}")
+
+            # ---- WAKE-WORD LOGIK ----
+            antworten = True
+            frage = result
+            if USE_WAKE_WORD and WAKE_WORD:
+                if result.startswith(WAKE_WORD):
+                    frage = result[len(WAKE_WORD):].strip()
+                    if not frage:
+                        frage = "hallo"
+                    print(f"Wake-Word erkannt! Frage an Gemini: {frage}")
+                else:
+                    antworten = False
+                    trace.finish("no_wake_word")
+                    print(f"Wake-Word '{WAKE_WORD}' nicht erkannt, keine Antwort!")
+                    # Optional: Discord-Hinweis
+                    # await self.channel.send(f"Bitte beginne deinen Satz mit '{WAKE_WORD}', damit ich antworte.")
+            else:
+                print("Wake-Word deaktiviert oder leer – Bot antwortet immer.")
 
-            if self.buffer:
+            if antworten:
+                trace.mark("wake_word")
+                # Erst zählen, wenn die Frage wirklich an Gemini geht
+                if not speaker.allow_turn():
+                    print(f"{speaker.name} asks too often, not answering")
+                    trace.finish("rate_limited")
+                    return
+                if self.multi_speaker:
+                    # Erst jetzt ist klar, dass der Bot gemeint war
+                    self._barge_in()
                 try:
-                    print("Audio capture stopped")
-                    sample_rate = 48000
-                    sample_width = 4
-
-                    audio_data = sr.AudioData(self.buffer, sample_rate, sample_width)
-                    wav_data = audio_data.get_wav_data()
-
-                    if not wav_data or not wav_data.strip():
-                        print("No words captured - audio appears to be silence")
-                        self.buffer = b""
-                        return
-
-                    audio_length = len(self.buffer) / (sample_rate * sample_width)
-                    if audio_length < 0.3:
-                        print("Audio too short - likely not a complete word")
-                        self.buffer = b""
-                        return
-
-                    self.buffer = b""
-
-                    if audio_data.get_wav_data().strip():
-                        result = convert_audio_to_text_using_google_speech(audio_data)
-                        # Fehlerbehandlung:
-                        if result in ["rate_limit", "service_error", "error"]:
-                            if result == "rate_limit":
-                                future = asyncio.run_coroutine_threadsafe(
-                                    self.channel.send("Google Speech API: Rate Limit erreicht. Bitte warte einen Moment, bevor du es erneut versuchst."),
-                                    self.bot.loop
-                                )
-                            elif result == "service_error":
-                                future = asyncio.run_coroutine_threadsafe(
-                                    self.channel.send("Probleme mit dem Sprachservice. Bitte später erneut versuchen."),
-                                    self.bot.loop
-                                )
-                            else:
-                                future = asyncio.run_coroutine_threadsafe(
-                                    self.channel.send("Etwas ist schiefgelaufen. Ich bin bereit zuzuhören."),
-                                    self.bot.loop
-                                )
-                            try:
-                                future.result(timeout=5)
-                            except Exception as e:
-                                print(f"Fehler beim senden der nachricht: {e}")
-                            return
-                        # Kein "Ich konnte dich nicht verstehen." mehr!
-
-                        print(f"Text: {result}")
-
-                        # ---- WAKE-WORD LOGIK ----
-                        antworten = True
-                        frage = result
-                        if USE_WAKE_WORD and WAKE_WORD:
-                            if result.startswith(WAKE_WORD):
-                                frage = result[len(WAKE_WORD):].strip()
-                                if not frage:
-                                    frage = "hallo"
-                                print(f"Wake-Word erkannt! Frage an Gemini: {frage}")
-                            else:
-                                antworten = False
-                                print(f"Wake-Word '{WAKE_WORD}' nicht erkannt, keine Antwort!")
-                                # Optional: Discord-Hinweis
-                                # asyncio.run_coroutine_threadsafe(
-                                #     self.channel.send(f"Bitte beginne deinen Satz mit '{WAKE_WORD}', damit ich antworte."),
-                                #     self.bot.loop
-                                # )
-                        else:
-                            print("Wake-Word deaktiviert oder leer – Bot antwortet immer.")
-
-                        if antworten:
-                            asyncio.run_coroutine_threadsafe(self.gemini_ws.process_text(frage, self._voice_client), self.bot.loop)
+                    session = await self._session()
                 except Exception as e:
-                    print(f"Error processing audio: {e}")
-                    traceback.print_exc()
+                    print(f"Keine Gemini-Session für die Frage: {e}")
+                    trace.finish("no_session")
+                    return
+                if not await session.process_text(frage, self._voice_client, speaker=speaker.user.id,
+                                                  speaker_name=self._speaker_name(speaker), trace=trace):
+                    print(f"Frage wurde nicht beantwortet: {frage}")
+        except Exception as e:
+            print(f"Error processing audio: {e}")
+            traceback.print_exc()
+            trace.finish("error")
 
     def cleanup(self) -> None:
         pass
@@ -0,0 +1,143 @@
+import threading
+from typing import Any, Dict, Optional
+
+
+class PCMRingBuffer:
+    """Bounded byte ring for streaming PCM between two threads.
+
+    Meant for a single producer (the bot event loop writing Gemini audio) and
+    a single consumer (discord's player thread). Storage starts at
+    ``capacity`` bytes and doubles, up to ``max_capacity``, when a write does
+    not fit, so short answers never pay for the longest one. Reads hand out
+    memoryviews into it, so a frame is only copied when it wraps around the
+    end of the ring.
+
+    Consumers call ``peek`` to get a frame and ``advance`` once they are done
+    with the view. The space of a peeked frame is not reused before that.
+    """
+
+    def __init__(self, capacity: int, max_capacity: Optional[int] = None) -> None:
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity: int = capacity
+        self.max_capacity: int = max(capacity, max_capacity or capacity)
+        self.grows: int = 0
+        self._storage: bytearray = bytearray(capacity)
+        self._view: memoryview = memoryview(self._storage)
+        self._scratch: bytearray = bytearray()
+        self._lock: threading.Lock = threading.Lock()
+        self._read_pos: int = 0
+        self._size: int = 0
+        self.closed: bool = False
+        self.bytes_written: int = 0
+        self.bytes_read: int = 0
+        self.overflows: int = 0
+        self.overflow_bytes: int = 0
+        self.underruns: int = 0
+
+    @property
+    def available(self) -> int:
+        return self._size
+
+    @property
+    def free(self) -> int:
+        return self.capacity - self._size
+
+    def write(self, data: bytes) -> int:
+        """Copies as much of ``data`` as fits and returns the number of bytes stored.
+
+        Bytes that do not fit are dropped and counted as overflow.
+        """
+        with self._lock:
+            if self.closed:
+                return 0
+            if len(data) > self.capacity - self._size and self.capacity < self.max_capacity:
+                self._grow(self._size + len(data))
+            count = min(len(data), self.capacity - self._size)
+            if count < len(data):
+                self.overflows += 1
+                self.overflow_bytes += len(data) - count
+            if count == 0:
+                return 0
+            src = memoryview(data)[:count]
+            start = (self._read_pos + self._size) % self.capacity
+            first = min(count, self.capacity - start)
+            self._view[start:start + first] = src[:first]
+            if first < count:
+                self._view[:count - first] = src[first:]
+            self._size += count
+            self.bytes_written += count
+            return count
+
+    def _grow(self, needed: int) -> None:
+        """Moves the buffered bytes into larger storage, called with the lock held.
+
+        Views handed out by ``peek`` keep the old storage alive and still see
+        their frame, ``advance`` works on the new positions.
+        """
+        capacity = self.capacity
+        while capacity < needed and capacity < self.max_capacity:
+            capacity = min(self.max_capacity, capacity * 2)
+        storage = bytearray(capacity)
+        first = min(self._size, self.capacity - self._read_pos)
+        storage[:first] = self._view[self._read_pos:self._read_pos + first]
+        storage[first:self._size] = self._view[:self._size - first]
+        self._storage = storage
+        self._view = memoryview(storage)
+        self._read_pos = 0
+        self.capacity = capacity
+        self.grows += 1
+
+    def peek(self, size: int) -> Optional[memoryview]:
+        """Returns a view of the next ``size`` bytes without consuming them.
+
+        Returns None (and counts an underrun) if fewer bytes are buffered and
+        the producer has not closed the ring yet. After ``close`` the
+        remaining tail is returned even if it is shorter, and an empty view
+        signals the end of the stream.
+        """
+        with self._lock:
+            if self._size < size:
+                if not self.closed:
+                    self.underruns += 1
+                    return None
+                size = self._size
+            start = self._read_pos
+            if start + size <= self.capacity:
+                return self._view[start:start + size]
+            first = self.capacity - start
+            if len(self._scratch) != size:
+                self._scratch = bytearray(size)
+            self._scratch[:first] = self._view[start:]
+            self._scratch[first:size] = self._view[:size - first]
+            return memoryview(self._scratch)[:size]
+
+    def advance(self, size: int) -> None:
+        """Releases ``size`` bytes previously returned by ``peek``."""
+        with self._lock:
+            size = min(size, self._size)
+            self._read_pos = (self._read_pos + size) % self.capacity
+            self._size -= size
+            self.bytes_read += size
+
+    def close(self) -> None:
+        """Marks the end of the stream, readers drain what is left."""
+        with self._lock:
+            self.closed = True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._read_pos = 0
+            self._size = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "grows": self.grows,
+            "buffered": self._size,
+            "bytes_written": self.bytes_written,
+            "bytes_read": self.bytes_read,
+            "overflows": self.overflows,
+            "overflow_bytes": self.overflow_bytes,
+            "underruns": self.underruns,
+        }
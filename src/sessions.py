@@ -0,0 +1,361 @@
+import asyncio
+import time
+from concurrent.futures import Executor
+from typing import Any, Dict, Hashable, List, NamedTuple, Optional
+from src.cache import AnswerCache
+from src.gemini import DEFAULT_MODEL, GeminiWebSocket
+from src.metrics import Histogram
+from src.settings import GuildSettings
+from src.stream import PlayoutPolicy
+
+
+class SessionProfile(NamedTuple):
+    """Everything that is fixed by a session's setup() message."""
+    model: str
+    voice: str
+    persona: str
+
+
+class GeminiSessionManager:
+    """Gives every guild its own Gemini websocket session.
+
+    Sessions are created and connected lazily by ``get`` and closed by
+    ``close`` or once they have been idle for ``idle_timeout`` seconds. At
+    most ``max_sessions`` exist at a time; further callers first try to evict
+    an idle session and otherwise wait up to ``wait_timeout`` seconds for one
+    to be closed.
+
+    With ``warm_sessions`` set, that many sessions per profile (model, voice,
+    persona) are kept connected and set up in the background, so ``get`` only
+    has to hand one over. The default profile is always kept warm, others
+    while a guild used them within ``idle_timeout``. Warm sessions count
+    towards ``max_sessions``, are the first to go when the limit is reached
+    and are replaced after ``warm_max_age`` seconds. Per-guild voice and
+    persona come from ``settings``; once they changed, ``get`` replaces the
+    guild's session as soon as it is idle.
+    """
+
+    def __init__(self,
+                 voice: str = 'aoede',
+                 persona: str = "You are a helpful assistant",
+                 prebuffer_ms: int = 60,
+                 max_prebuffer_ms: int = 400,
+                 max_sessions: int = 10,
+                 idle_timeout: float = 600.0,
+                 wait_timeout: float = 30.0,
+                 uri: Optional[str] = None,
+                 turn_policy: str = "queue",
+                 max_pending_turns: int = 4,
+                 turn_max_wait: float = 15.0,
+                 cache: Optional[AnswerCache] = None,
+                 encode_pool: Optional[Executor] = None,
+                 model: str = DEFAULT_MODEL,
+                 warm_sessions: int = 0,
+                 warm_max_age: float = 600.0,
+                 settings: Optional[GuildSettings] = None) -> None:
+        self.voice: str = voice
+        self.persona: str = persona
+        self.model: str = model
+        self.prebuffer_ms: int = prebuffer_ms
+        self.max_prebuffer_ms: int = max_prebuffer_ms
+        self.max_sessions: int = max_sessions
+        self.idle_timeout: float = idle_timeout
+        self.wait_timeout: float = wait_timeout
+        self.uri: Optional[str] = uri
+        self.turn_policy: str = turn_policy
+        self.max_pending_turns: int = max_pending_turns
+        self.turn_max_wait: float = turn_max_wait
+        # Wird von allen Sessions geteilt, der Schlüssel enthält Persona und Stimme
+        self.cache: Optional[AnswerCache] = cache
+        self.encode_pool: Optional[Executor] = encode_pool
+        self.settings: Optional[GuildSettings] = settings
+        self.sessions: Dict[Hashable, GeminiWebSocket] = {}
+        self.condition: asyncio.Condition = asyncio.Condition()
+        self.reaper_task: Optional[asyncio.Task[None]] = None
+        self.warm_sessions: int = warm_sessions
+        self.warm_max_age: float = warm_max_age
+        self.warm: Dict[SessionProfile, List[GeminiWebSocket]] = {}
+        self.warming: int = 0
+        self.profile_used: Dict[SessionProfile, float] = {}
+        self.refill_event: asyncio.Event = asyncio.Event()
+        self.refill_task: Optional[asyncio.Task[None]] = None
+        self.created: int = 0
+        self.closed: int = 0
+        self.idle_closed: int = 0
+        self.timeouts: int = 0
+        self.waiting: int = 0
+        self.max_waiting: int = 0
+        self.total_wait: float = 0.0
+        self.pool_hits: int = 0
+        self.pool_misses: int = 0
+        self.warmed: int = 0
+        self.warm_closed: int = 0
+        self.acquire_seconds: Dict[str, Histogram] = {"hit": Histogram(), "miss": Histogram()}
+
+    def start(self) -> None:
+        """Starts the idle reaper and the pool refill, call once the event loop is running."""
+        if self.reaper_task is None or self.reaper_task.done():
+            self.reaper_task = asyncio.create_task(self._reap_idle())
+        if self.warm_sessions and (self.refill_task is None or self.refill_task.done()):
+            self.refill_task = asyncio.create_task(self._refill())
+            self.refill_event.set()
+
+    @property
+    def default_profile(self) -> SessionProfile:
+        return SessionProfile(self.model, self.voice, self.persona)
+
+    def profile_for(self, key: Hashable) -> SessionProfile:
+        overrides = self.settings.get(key) if self.settings else {}
+        return SessionProfile(
+            self.model,
+            overrides.get("voice", self.voice),
+            overrides.get("persona", self.persona),
+        )
+
+    def configure(self, key: Hashable, **values: Optional[str]) -> SessionProfile:
+        """Changes voice/persona of a guild, applies from its next turn.
+
+        The new profile is warmed up right away so ``get`` can swap the
+        guild's session for one from the pool.
+        """
+        if self.settings is None:
+            raise RuntimeError("No guild settings configured")
+        self.settings.update(key, **values)
+        profile = self.profile_for(key)
+        self.profile_used[profile] = time.monotonic()
+        self.refill_event.set()
+        return profile
+
+    def new_session(self, profile: Optional[SessionProfile] = None) -> GeminiWebSocket:
+        profile = profile or self.default_profile
+        return GeminiWebSocket(
+            voice=profile.voice,
+            persona=profile.persona,
+            model=profile.model,
+            playout=PlayoutPolicy(target_ms=self.prebuffer_ms, max_ms=self.max_prebuffer_ms),
+            uri=self.uri,
+            turn_policy=self.turn_policy,
+            max_pending_turns=self.max_pending_turns,
+            turn_max_wait=self.turn_max_wait,
+            cache=self.cache,
+            encode_pool=self.encode_pool,
+        )
+
+    def _open_sessions(self) -> int:
+        return len(self.sessions) + sum(len(w) for w in self.warm.values()) + self.warming
+
+    async def get(self, key: Hashable) -> GeminiWebSocket:
+        """Returns the connected session for ``key``, creating it if needed.
+
+        Raises asyncio.TimeoutError if no slot frees up within wait_timeout.
+        """
+        started = time.monotonic()
+        profile: Optional[SessionProfile] = None
+        replaced: Optional[GeminiWebSocket] = None
+        async with self.condition:
+            session = self.sessions.get(key)
+            if session is not None and not session.busy and self._profile_of(session) != self.profile_for(key):
+                # /voice oder /persona wurde benutzt, das steht im setup() und geht nur mit neuer Session
+                print(f"Profile of {key} changed, replacing its session")
+                replaced = self.sessions.pop(key)
+                self.closed += 1
+                session = None
+            if session is None:
+                profile = self.profile_for(key)
+                self.profile_used[profile] = time.monotonic()
+                session = self._take_warm(profile)
+                if session is None:
+                    if self._open_sessions() >= self.max_sessions:
+                        await self._evict_one_idle()
+                    if self._open_sessions() >= self.max_sessions:
+                        await self._wait_for_slot()
+                    session = self.new_session(profile)
+                    self.created += 1
+                self.sessions[key] = session
+        if replaced is not None:
+            await replaced.close()
+        try:
+            await session.connect()
+        except Exception:
+            await self.close(key)
+            raise
+        session.touch()
+        if profile is not None:
+            outcome = "hit" if session.from_pool else "miss"
+            if session.from_pool:
+                self.pool_hits += 1
+            else:
+                self.pool_misses += 1
+            self.acquire_seconds[outcome].observe(time.monotonic() - started)
+            # Nachfüllen, was gerade aus dem Pool genommen wurde
+            self.refill_event.set()
+        return session
+
+    @staticmethod
+    def _profile_of(session: GeminiWebSocket) -> SessionProfile:
+        return SessionProfile(session.model, session.voice, session.persona)
+
+    def _take_warm(self, profile: SessionProfile) -> Optional[GeminiWebSocket]:
+        warm = self.warm.get(profile)
+        if not warm:
+            return None
+        # Die zuletzt aufgebaute hat die längste Restlaufzeit
+        session = warm.pop()
+        session.from_pool = True
+        return session
+
+    async def close(self, key: Hashable) -> None:
+        async with self.condition:
+            session = self.sessions.pop(key, None)
+            if session is None:
+                return
+            self.closed += 1
+            self.condition.notify()
+        await session.close()
+
+    async def close_all(self) -> None:
+        if self.refill_task and not self.refill_task.done():
+            self.refill_task.cancel()
+        for key in list(self.sessions):
+            await self.close(key)
+        async with self.condition:
+            warm = [s for sessions in self.warm.values() for s in sessions]
+            self.warm.clear()
+        for session in warm:
+            await session.close()
+
+    async def _wait_for_slot(self) -> None:
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(
+                self.condition.wait_for(lambda: self._open_sessions() < self.max_sessions),
+                timeout=self.wait_timeout,
+            )
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            self.waiting -= 1
+            self.total_wait += time.monotonic() - started
+
+    async def _evict_one_idle(self) -> None:
+        """Closes the oldest warm session, else the least recently used idle one."""
+        warm = [(s.last_used, p) for p, sessions in self.warm.items() for s in sessions]
+        if warm:
+            _, profile = min(warm)
+            session = self.warm[profile].pop(0)
+            self.warm_closed += 1
+            print("Session limit reached, closing a warm session")
+            await session.close()
+            return
+        idle = [(s.last_used, k) for k, s in self.sessions.items() if not s.busy]
+        if not idle:
+            return
+        _, key = min(idle)
+        session = self.sessions.pop(key)
+        self.closed += 1
+        self.idle_closed += 1
+        print(f"Session limit reached, closing idle session {key}")
+        await session.close()
+
+    def _wanted_profiles(self) -> List[SessionProfile]:
+        now = time.monotonic()
+        wanted = [self.default_profile]
+        for profile, used in self.profile_used.items():
+            if profile not in wanted and now - used <= self.idle_timeout:
+                wanted.append(profile)
+        return wanted
+
+    async def _refill(self) -> None:
+        """Keeps ``warm_sessions`` set-up sessions per wanted profile."""
+        while True:
+            await self.refill_event.wait()
+            self.refill_event.clear()
+            try:
+                await self._fill_pool()
+            except Exception as e:
+                # Der Pool darf nicht für immer leer bleiben, nur weil einmal etwas schiefging
+                print(f"Refilling the session pool failed: {e}")
+                asyncio.get_running_loop().call_later(30.0, self.refill_event.set)
+
+    async def _fill_pool(self) -> None:
+        for profile in self._wanted_profiles():
+            while (len(self.warm.get(profile, [])) < self.warm_sessions
+                   and self._open_sessions() < self.max_sessions):
+                session = self.new_session(profile)
+                self.warming += 1
+                try:
+                    await session.connect()
+                except Exception as e:
+                    print(f"Could not warm up a Gemini session: {e}")
+                    await session.close()
+                    # Später nochmal versuchen, nicht in einer Schleife
+                    asyncio.get_running_loop().call_later(30.0, self.refill_event.set)
+                    break
+                finally:
+                    self.warming -= 1
+                session.touch()
+                async with self.condition:
+                    self.warm.setdefault(profile, []).append(session)
+                self.warmed += 1
+
+    async def _close_stale_warm(self) -> None:
+        """Replaces old warm sessions and drops profiles nobody uses anymore."""
+        now = time.monotonic()
+        wanted = self._wanted_profiles()
+        stale = []
+        async with self.condition:
+            for profile, sessions in list(self.warm.items()):
+                keep = [s for s in sessions if profile in wanted and now - s.last_used <= self.warm_max_age]
+                stale.extend(s for s in sessions if s not in keep)
+                if keep:
+                    self.warm[profile] = keep
+                else:
+                    del self.warm[profile]
+            self.condition.notify_all()
+        for session in stale:
+            self.warm_closed += 1
+            await session.close()
+        for profile, used in list(self.profile_used.items()):
+            if now - used > self.idle_timeout:
+                del self.profile_used[profile]
+        if stale:
+            self.refill_event.set()
+
+    async def _reap_idle(self) -> None:
+        while True:
+            await asyncio.sleep(min(60.0, self.idle_timeout, self.warm_max_age))
+            now = time.monotonic()
+            expired = [
+                k for k, s in self.sessions.items()
+                if not s.busy and now - s.last_used > self.idle_timeout
+            ]
+            for key in expired:
+                print(f"Closing idle Gemini session {key}")
+                self.idle_closed += 1
+                await self.close(key)
+            await self._close_stale_warm()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active_sessions": len(self.sessions),
+            "busy_sessions": sum(1 for s in self.sessions.values() if s.busy),
+            "warm_sessions": sum(len(w) for w in self.warm.values()),
+            "warm_profiles": len(self.warm),
+            "created": self.created,
+            "closed": self.closed,
+            "idle_closed": self.idle_closed,
+            "pool_hits": self.pool_hits,
+            "pool_misses": self.pool_misses,
+            "warmed": self.warmed,
+            "warm_closed": self.warm_closed,
+            "acquire_hit": self.acquire_seconds["hit"].summary(),
+            "acquire_miss": self.acquire_seconds["miss"].summary(),
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "total_wait_s": round(self.total_wait, 3),
+            "wait_timeouts": self.timeouts,
+            "cache": self.cache.stats() if self.cache else None,
+        }
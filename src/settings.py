@@ -0,0 +1,66 @@
+import json
+import os
+import threading
+from typing import Any, Dict, Hashable, Optional
+
+
+class GuildSettings:
+    """Per-guild voice/persona overrides set with slash commands.
+
+    Every guild is stored in its own small JSON file in ``directory`` so the
+    worker processes of the sharded mode never write the same file. Values
+    that are not set fall back to the defaults from main.py.
+    """
+
+    def __init__(self, directory: Optional[str] = "guild_settings") -> None:
+        self.directory: Optional[str] = directory
+        self._settings: Dict[Hashable, Dict[str, Any]] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def _path(self, guild: Hashable) -> str:
+        return os.path.join(self.directory, f"{guild}.json")
+
+    def get(self, guild: Hashable) -> Dict[str, Any]:
+        with self._lock:
+            if guild not in self._settings:
+                self._settings[guild] = self._load(guild)
+            return dict(self._settings[guild])
+
+    def update(self, guild: Hashable, **values: Any) -> Dict[str, Any]:
+        """Sets the given values, ``None`` removes an override."""
+        with self._lock:
+            settings = self._settings.get(guild)
+            if settings is None:
+                settings = self._load(guild)
+            for name, value in values.items():
+                if value is None:
+                    settings.pop(name, None)
+                else:
+                    settings[name] = value
+            self._settings[guild] = settings
+            self._save(guild, settings)
+            return dict(settings)
+
+    def _load(self, guild: Hashable) -> Dict[str, Any]:
+        if not self.directory:
+            return {}
+        try:
+            with open(self._path(guild), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"Could not read settings of guild {guild}: {e}")
+            return {}
+
+    def _save(self, guild: Hashable, settings: Dict[str, Any]) -> None:
+        if not self.directory:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = self._path(guild) + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(settings, f, ensure_ascii=False)
+            os.replace(tmp, self._path(guild))
+        except OSError as e:
+            print(f"Could not save settings of guild {guild}: {e}")
@@ -0,0 +1,183 @@
+import threading
+import time
+from typing import Any, Dict, Hashable, List, Optional
+from src.capture import CaptureBuffer
+from src.ratelimit import TokenBucket
+from src.resample import Downsampler
+
+
+class PendingUtterance:
+    """Audio of one speaker that is waiting for speech recognition.
+
+    Until a recognition worker ``take``s it, later fragments of the same
+    speaker can still be appended, so "nano ... wie spät ist es" cut in two
+    by a short pause becomes one request.
+    """
+
+    def __init__(self, pcm: bytes, trace: Any, deadline: float) -> None:
+        self.parts: List[bytes] = [pcm]
+        self.size: int = len(pcm)
+        self.trace: Any = trace
+        self.deadline: float = deadline
+        self.last_added: float = time.monotonic()
+        self.taken: bool = False
+
+
+class Speaker:
+    """Capture state of one user in the voice channel.
+
+    Every speaker gets their own capture buffer and downsampler, so
+    utterances of people talking at the same time never mix. ``allow_turn``
+    limits how many turns per minute the speaker may send to Gemini, with
+    ``turns_per_minute=None`` it only counts them.
+    """
+
+    def __init__(self,
+                 user: Any,
+                 max_utterance_seconds: float = 30.0,
+                 stream_rate: int = 16000,
+                 turns_per_minute: Optional[float] = 6.0,
+                 burst: int = 3) -> None:
+        self.user: Any = user
+        self.name: str = getattr(user, "display_name", None) or str(user)
+        self.capture: CaptureBuffer = CaptureBuffer(max_utterance_seconds)
+        self.downsampler: Downsampler = Downsampler(stream_rate)
+        self.stream_chunk: bytearray = bytearray()
+        self.streamed_bytes: int = 0
+        # Audio-Modus: das ganze Audio der Frage, und an welche Session es live ging (None = noch gar nicht)
+        self.stream_audio: List[bytes] = []
+        self.stream_session: Optional[Any] = None
+        self.stream_epoch: int = 0
+        self.max_stream_bytes: int = int(max_utterance_seconds * stream_rate * 2)
+        self.barged_in: bool = False
+        self.recording: bool = False
+        self.last_active: float = time.monotonic()
+        self.bucket: Optional[TokenBucket] = (
+            TokenBucket(per_minute=turns_per_minute, burst=burst) if turns_per_minute else None
+        )
+        self.turns: int = 0
+        self.rate_limited: int = 0
+        self.max_utterance_bytes: int = self.capture.max_bytes
+        self.pending: Optional[PendingUtterance] = None
+        self.coalesced: int = 0
+        self._lock: threading.Lock = threading.Lock()
+
+    def allow_turn(self) -> bool:
+        if self.bucket is not None and not self.bucket.try_acquire():
+            self.rate_limited += 1
+            return False
+        self.turns += 1
+        return True
+
+    def coalesce(self, pcm: bytes, gap: float, window: float) -> bool:
+        """Appends ``pcm`` to the waiting utterance if it started within ``window``
+        seconds after that one ended (``gap``: seconds between its start and now).
+        """
+        with self._lock:
+            pending = self.pending
+            if pending is None or pending.taken or pending.size + len(pcm) > self.max_utterance_bytes:
+                return False
+            if time.monotonic() - gap - pending.last_added > window:
+                return False
+            pending.parts.append(pcm)
+            pending.size += len(pcm)
+            pending.last_added = time.monotonic()
+            self.coalesced += 1
+            return True
+
+    def queue_utterance(self, pcm: bytes, trace: Any, deadline: float) -> PendingUtterance:
+        with self._lock:
+            self.pending = PendingUtterance(pcm, trace, deadline)
+            return self.pending
+
+    def take(self, pending: PendingUtterance) -> bytes:
+        """Called by the recognition worker, no more fragments after this."""
+        with self._lock:
+            pending.taken = True
+            if self.pending is pending:
+                self.pending = None
+            return b"".join(pending.parts)
+
+
+class SpeakerTable:
+    """Per-user capture pipelines of one voice channel, looked up per packet.
+
+    ``get`` is a single dict lookup for known speakers, so the per-packet cost
+    does not grow with the number of people in the channel. At most
+    ``max_speakers`` are tracked; when a new one arrives the speaker that has
+    been quiet the longest is forgotten, and if everybody is recording the
+    newcomer is ignored until someone stops.
+    """
+
+    def __init__(self,
+                 max_speakers: int = 4,
+                 max_utterance_seconds: float = 30.0,
+                 stream_rate: int = 16000,
+                 turns_per_minute: Optional[float] = 6.0,
+                 burst: int = 3) -> None:
+        self.max_speakers: int = max_speakers
+        self.max_utterance_seconds: float = max_utterance_seconds
+        self.stream_rate: int = stream_rate
+        self.turns_per_minute: Optional[float] = turns_per_minute
+        self.burst: int = burst
+        self.speakers: Dict[Hashable, Speaker] = {}
+        self._lock: threading.Lock = threading.Lock()
+        self.rejected: int = 0
+        self.evicted: int = 0
+        # Zähler vergessener Sprecher, damit stats() nichts verliert
+        self.retired_turns: int = 0
+        self.retired_rate_limited: int = 0
+        self.retired_coalesced: int = 0
+        self.retired_capture: Dict[str, int] = {"bytes_captured": 0, "utterances": 0, "utterances_truncated": 0}
+
+    def get(self, user: Any) -> Optional[Speaker]:
+        speaker = self.speakers.get(user.id)
+        if speaker is not None:
+            return speaker
+        # Nur neue Sprecher brauchen das Lock, bekannte kosten einen dict-Zugriff
+        with self._lock:
+            speaker = self.speakers.get(user.id)
+            if speaker is not None:
+                return speaker
+            if len(self.speakers) >= self.max_speakers and not self._evict_quiet():
+                self.rejected += 1
+                return None
+            speaker = Speaker(user, self.max_utterance_seconds, self.stream_rate, self.turns_per_minute, self.burst)
+            self.speakers[user.id] = speaker
+            print(f"Tracking speaker {speaker.name} ({len(self.speakers)}/{self.max_speakers})")
+            return speaker
+
+    def _evict_quiet(self) -> bool:
+        quiet = [(s.last_active, k) for k, s in self.speakers.items() if not s.recording]
+        if not quiet:
+            return False
+        _, key = min(quiet)
+        speaker = self.speakers.pop(key)
+        self.retired_turns += speaker.turns
+        self.retired_rate_limited += speaker.rate_limited
+        self.retired_coalesced += speaker.coalesced
+        capture = speaker.capture.stats()
+        for key in self.retired_capture:
+            self.retired_capture[key] += capture[key]
+        self.evicted += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        speakers = list(self.speakers.values())
+        return {
+            "speakers": len(speakers),
+            "recording": sum(1 for s in speakers if s.recording),
+            "rejected_speakers": self.rejected,
+            "evicted_speakers": self.evicted,
+            "turns": self.retired_turns + sum(s.turns for s in speakers),
+            "rate_limited": self.retired_rate_limited + sum(s.rate_limited for s in speakers),
+            "coalesced": self.retired_coalesced + sum(s.coalesced for s in speakers),
+            "capture": self._capture_stats(speakers),
+        }
+
+    def _capture_stats(self, speakers: List[Speaker]) -> Dict[str, int]:
+        totals = dict(self.retired_capture, buffered_bytes=0)
+        for speaker in speakers:
+            for key, value in speaker.capture.stats().items():
+                totals[key] += value
+        return totals
@@ -1,85 +1,313 @@
-import asyncio
-from queue import Queue, Empty
+import threading
+import time
 import discord
-from typing import Optional
+from collections import deque
+from concurrent.futures import Executor
+from typing import Any, Callable, Deque, Dict, Optional
+from discord.opus import Encoder, OPUS_SILENCE
+from src.metrics import TurnTrace
+from src.resample import Upsampler, make_upsampler
+from src.ringbuffer import PCMRingBuffer
+
+class PlayoutPolicy:
+    """Decides how much audio to buffer before (re)starting playback.
+
+    The target grows after every underrun and slowly shrinks back while the
+    stream stays healthy. One policy is shared by all turns of a session, so
+    what it learned about the connection carries over to the next answer.
+    """
+    def __init__(self,
+                 target_ms: int = 60,
+                 min_ms: int = 20,
+                 max_ms: int = 400,
+                 grow_ms: int = 40,
+                 shrink_ms: int = 20,
+                 shrink_after_frames: int = 250) -> None:
+        self.min_ms: int = min_ms
+        self.max_ms: int = max_ms
+        self.target_ms: int = max(min_ms, min(target_ms, max_ms))
+        self.grow_ms: int = grow_ms
+        self.shrink_ms: int = shrink_ms
+        self.shrink_after_frames: int = shrink_after_frames
+        self.healthy_frames: int = 0
+
+    def on_underrun(self) -> None:
+        self.target_ms = min(self.max_ms, self.target_ms + self.grow_ms)
+        self.healthy_frames = 0
+
+    def on_frame(self) -> None:
+        self.healthy_frames += 1
+        if self.healthy_frames >= self.shrink_after_frames:
+            self.target_ms = max(self.min_ms, self.target_ms - self.shrink_ms)
+            self.healthy_frames = 0
 
 class QueuedStreamingPCMAudio(discord.AudioSource):
-    def __init__(self, async_queue: asyncio.Queue[Optional[bytes]]) -> None:
-        self.async_queue = async_queue
-        self.sync_queue: Queue[Optional[bytes]] = Queue()
-        self.buffer: bytearray = bytearray()
-        self.pos: int = 0
-        self._end_flag: bool = False
-        self.interrupted: bool = False
+    def __init__(self,
+                 upsampler: Optional[Upsampler] = None,
+                 capacity_seconds: float = 120.0,
+                 initial_seconds: float = 5.0,
+                 policy: Optional[PlayoutPolicy] = None,
+                 on_silenced: Optional[Callable[[float], None]] = None,
+                 trace: Optional[TurnTrace] = None) -> None:
         self.input_frame_size: int = 960  # For 24kHz mono
         self.output_frame_size: int = 3840  # 20ms at 48kHz stereo
+        self.bytes_per_ms: int = self.input_frame_size // 20
         self.silence: bytes = b'\x00' * self.output_frame_size
-        self.buffer_task: Optional[asyncio.Task[None]] = None
-        self._start_buffer_task()
+        self.upsampler: Upsampler = upsampler or make_upsampler()
+        # Gemini schickt schneller als Echtzeit, der Ring wächst bis er eine ganze Antwort fasst
+        self.ring: PCMRingBuffer = PCMRingBuffer(
+            int(min(initial_seconds, capacity_seconds) * 50) * self.input_frame_size,
+            int(capacity_seconds * 50) * self.input_frame_size,
+        )
+        self.policy: PlayoutPolicy = policy or PlayoutPolicy()
+        self.buffering: bool = True
+        self.interrupted: bool = False
+        self.interrupted_at: Optional[float] = None
+        self.silenced_at: Optional[float] = None
+        self.on_silenced: Optional[Callable[[float], None]] = on_silenced
+        self.trace: Optional[TurnTrace] = trace
+        self.started_at: float = time.perf_counter()
+        self.first_audio_at: Optional[float] = None
+        self.rebuffers: int = 0
+        self.max_buffered: int = 0
 
-    def _start_buffer_task(self) -> None:
-        async def buffer_filler() -> None:
-            try:
-                while not self._end_flag:
-                    try:
-                        chunk = await self.async_queue.get()
-                        if chunk is None:
-                            self._end_flag = True
-                            break
-                        self.sync_queue.put(chunk)
-                    except asyncio.CancelledError:
-                        break
-                    except Exception as e:
-                        print(f"Buffer fill error: {e}")
-                        break
-            finally:
-                self.sync_queue.put(None)
-                
-        self.buffer_task = asyncio.create_task(buffer_filler())
+    def feed(self, chunk: bytes) -> None:
+        """Called from the event loop with 24kHz mono PCM from Gemini."""
+        self.ring.write(chunk)
+        self.max_buffered = max(self.max_buffered, self.ring.available)
+
+    def finish(self) -> None:
+        """Marks the end of the answer, read() drains the rest and then stops."""
+        self.ring.close()
+
+    def interrupt(self) -> None:
+        """Barge-in: stop at the next frame and throw away what is buffered.
+
+        Safe to call from any thread.
+        """
+        if self.interrupted_at is None:
+            self.interrupted_at = time.perf_counter()
+        self.interrupted = True
+        self.ring.close()
+
+    def _mark_silenced(self) -> None:
+        if self.interrupted_at is not None and self.silenced_at is None:
+            self.silenced_at = time.perf_counter()
+            if self.on_silenced:
+                self.on_silenced(self.silenced_at - self.interrupted_at)
 
     def read(self) -> bytes:
         try:
-            # Fill buffer if needed
-            while len(self.buffer) - self.pos < self.input_frame_size:
-                try:
-                    chunk = self.sync_queue.get_nowait()
-                    if chunk is None:
-                        if len(self.buffer) - self.pos <= 0:
-                            return b''
-                        break
-                    self.buffer.extend(chunk)
-                except Empty:
+            if self.interrupted:
+                self._mark_silenced()
+                return b''
+
+            if self.buffering:
+                target = self.policy.target_ms * self.bytes_per_ms
+                if self.ring.available < target and not self.ring.closed:
                     return self.silence
+                self.buffering = False
+
+            chunk = self.ring.peek(self.input_frame_size)
+            if chunk is None:
+                # Mitten im Satz leergelaufen: Puffer vergrößern und neu vorpuffern
+                self.policy.on_underrun()
+                self.rebuffers += 1
+                self.buffering = True
+                return self.silence
+            if not chunk:
+                if self.trace:
+                    self.trace.mark("playback_finished")
+                return b''
+
+            try:
+                result = self.upsampler.convert(chunk)
+            finally:
+                size = len(chunk)
+                chunk.release()
+                self.ring.advance(size)
+
+            if len(result) < self.output_frame_size:
+                result += self.silence[len(result):]
+
+            if self.first_audio_at is None:
+                self.first_audio_at = time.perf_counter()
+                if self.trace:
+                    self.trace.mark("playback_started")
+            self.policy.on_frame()
+            return result
+
+        except Exception as e:
+            print(f"Read error: {e}")
+            return self.silence
+
+    def stats(self) -> Dict[str, Any]:
+        ttfa = None
+        if self.first_audio_at is not None:
+            ttfa = round((self.first_audio_at - self.started_at) * 1000, 1)
+        return {
+            "time_to_first_audio_ms": ttfa,
+            "underruns": self.ring.underruns,
+            "rebuffers": self.rebuffers,
+            "buffered_ms": self.ring.available // self.bytes_per_ms,
+            "max_buffered_ms": self.max_buffered // self.bytes_per_ms,
+            "target_ms": self.policy.target_ms,
+            "overflow_bytes": self.ring.overflow_bytes,
+        }
 
-            view = memoryview(self.buffer)
-            chunk = view[self.pos:self.pos + self.input_frame_size]
-            self.pos += self.input_frame_size
+    def cleanup(self) -> None:
+        print(f"Cleaning up audio source... {self.stats()}")
+        self._mark_silenced()
+        if self.trace:
+            self.trace.mark("playback_finished")
+            self.trace.finish("interrupted" if self.interrupted_at is not None else "answered")
+        self.interrupted = True
+        self.ring.clear()
+
+
+class OpusStreamingAudio(QueuedStreamingPCMAudio):
+    """Variant that hands discord ready Opus packets.
+
+    For PCM sources discord.py encodes every 20 ms frame inside the player
+    thread, right after ``read`` upsampled it. Here ``feed`` and ``finish``
+    schedule the upsampling and encoding on ``executor`` as soon as Gemini's
+    chunks arrive, so ``read`` only pops a packet. One source is encoded by at
+    most one worker at a time because the Opus encoder keeps state between
+    frames; libopus is called through ctypes, which releases the GIL.
+
+    Workers only stay ``lookahead_ms`` ahead of playback (at least twice the
+    prebuffer) and then requeue the source, so a long answer does not keep a
+    worker away from the other guilds' first frames.
+
+    Raises discord.opus.OpusNotLoaded if libopus cannot be loaded.
+    """
+
+    def __init__(self, executor: Executor, lookahead_ms: int = 200, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        # Gleiche Einstellungen wie VoiceClient.play für PCM-Quellen
+        self.encoder: Encoder = Encoder()
+        self.executor: Executor = executor
+        self.lookahead_ms: int = lookahead_ms
+        self.packets: Deque[bytes] = deque()
+        self.silence = OPUS_SILENCE
+        self._lock: threading.Lock = threading.Lock()
+        self._encoding: bool = False
+        self._pending: bool = False
+        self.encoded_all: bool = False
+        self.encoded_frames: int = 0
+        self.encode_seconds: float = 0.0
+        self.underruns: int = 0
+
+    def is_opus(self) -> bool:
+        return True
+
+    def feed(self, chunk: bytes) -> None:
+        super().feed(chunk)
+        self._schedule()
+
+    def finish(self) -> None:
+        super().finish()
+        self._schedule()
+
+    def _schedule(self) -> None:
+        with self._lock:
+            self._pending = True
+            if self._encoding:
+                return
+            self._encoding = True
+        self.executor.submit(self._encode)
+
+    def _encode(self) -> None:
+        """Runs on an encoder worker, one batch per call."""
+        with self._lock:
+            self._pending = False
+        try:
+            self._encode_available()
+        except Exception as e:
+            print(f"Encode error: {e}")
+            self.encoded_all = True
+        with self._lock:
+            if not self._pending or self.encoded_all or self.interrupted:
+                self._encoding = False
+                return
+        # Hinten anstellen, damit die anderen Quellen auch drankommen
+        self.executor.submit(self._encode)
+
+    def _lookahead_frames(self) -> int:
+        return max(self.lookahead_ms, 2 * self.policy.target_ms) // 20
+
+    def _encode_available(self) -> None:
+        started = time.perf_counter()
+        while not self.interrupted and len(self.packets) < self._lookahead_frames():
+            # Angefangene Frames erst am Ende der Antwort auffüllen
+            if self.ring.available < self.input_frame_size and not self.ring.closed:
+                break
+            chunk = self.ring.peek(self.input_frame_size)
+            if chunk is None:
+                break
+            if not chunk:
+                self.encoded_all = True
+                break
+            try:
+                pcm = self.upsampler.convert(chunk)
+            finally:
+                size = len(chunk)
+                chunk.release()
+                self.ring.advance(size)
+            if len(pcm) < self.output_frame_size:
+                pcm += b'\x00' * (self.output_frame_size - len(pcm))
+            self.packets.append(self.encoder.encode(pcm, self.encoder.SAMPLES_PER_FRAME))
+            self.encoded_frames += 1
+        self.encode_seconds += time.perf_counter() - started
 
-            if self.pos > 48000:  # Buffer cleanup
-                self.buffer = self.buffer[self.pos:]
-                self.pos = 0
+    def read(self) -> bytes:
+        try:
+            if self.interrupted:
+                self._mark_silenced()
+                return b''
+
+            # Vor dem Leeren der Queue lesen, sonst geht das letzte Paket verloren
+            done = self.encoded_all
+            if self.buffering:
+                if len(self.packets) * 20 < self.policy.target_ms and not done:
+                    return self.silence
+                self.buffering = False
 
-            result = bytearray(self.output_frame_size)
-            
-            for i in range(0, len(chunk), 2):
-                sample = chunk[i:i+2]
-                pos = i * 4
-                result[pos:pos+2] = sample
-                result[pos+2:pos+4] = sample
-                result[pos+4:pos+6] = sample
-                result[pos+6:pos+8] = sample
+            try:
+                packet = self.packets.popleft()
+            except IndexError:
+                if done:
+                    if self.trace:
+                        self.trace.mark("playback_finished")
+                    return b''
+                self.policy.on_underrun()
+                self.underruns += 1
+                self.rebuffers += 1
+                self.buffering = True
+                return self.silence
 
-            return bytes(result)
+            # Erst nachkodieren lassen, wenn die Hälfte des Vorlaufs gespielt ist
+            if not done and len(self.packets) <= self._lookahead_frames() // 2:
+                self._schedule()
+            if self.first_audio_at is None:
+                self.first_audio_at = time.perf_counter()
+                if self.trace:
+                    self.trace.mark("playback_started")
+            self.policy.on_frame()
+            return packet
 
         except Exception as e:
             print(f"Read error: {e}")
             return self.silence
 
+    def stats(self) -> Dict[str, Any]:
+        result = super().stats()
+        result["underruns"] = self.underruns
+        result["buffered_ms"] = len(self.packets) * 20 + self.ring.available // self.bytes_per_ms
+        result["encoded_frames"] = self.encoded_frames
+        result["encode_ms_per_frame"] = round(self.encode_seconds * 1000 / max(1, self.encoded_frames), 3)
+        return result
+
     def cleanup(self) -> None:
-        print("Cleaning up audio source...")
-        self._end_flag = True
-        self.interrupted: bool = True
-        if self.buffer_task and not self.buffer_task.done():
-            self.buffer_task.cancel()
-        self.buffer.clear()
-        self.pos = 0
\ No newline at end of file
+        super().cleanup()
+        self.packets.clear()
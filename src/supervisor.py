@@ -0,0 +1,256 @@
+"""Runs the bot as several worker processes with one shard range each.
+
+    python -m src.supervisor
+
+Every worker is a normal ``python main.py`` with SHARD_IDS, SHARD_COUNT,
+WORKER_INDEX, WORKER_COUNT and WORKER_METRICS_PORT in its environment. It
+runs an AutoShardedBot for its shards and has its own Gemini sessions,
+recognition pool and event loop, so the audio work of different guilds runs
+on different cores. Workers that exit are restarted with exponential
+backoff. With METRICS_PORT set, the supervisor serves the turn histograms of
+all workers added up on /metrics and every worker's /stats on /stats.
+"""
+import asyncio
+import json
+import os
+import signal
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence
+import aiohttp
+from dotenv import load_dotenv
+from src.metrics import MetricsRegistry, MetricsServer
+
+# ---- HIER EINSTELLEN ----
+WORKERS = os.cpu_count() or 1  # Worker-Prozesse, sinnvoll ist einer pro Kern
+SHARD_COUNT = None             # None = so viele, wie discord empfiehlt (mindestens WORKERS)
+METRICS_PORT = None            # z.B. 9108, die Worker bekommen die Ports dahinter
+IDENTIFY_SECONDS = 5.0         # discord erlaubt ein Shard-Login alle 5 Sekunden
+RESTART_BACKOFF_MAX = 60.0     # Längste Pause vor dem Neustart eines abgestürzten Workers
+# -------------------------
+
+MAIN: str = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+
+def shard_ranges(shard_count: int, workers: int) -> List[List[int]]:
+    """Splits the shards into ``workers`` contiguous, nearly equal ranges."""
+    workers = max(1, min(workers, shard_count))
+    size, extra = divmod(shard_count, workers)
+    ranges = []
+    start = 0
+    for index in range(workers):
+        end = start + size + (1 if index < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+async def recommended_shards(token: str) -> Optional[int]:
+    """Asks discord how many shards the bot should have."""
+    try:
+        async with aiohttp.ClientSession() as http:
+            async with http.get("https://discord.com/api/v10/gateway/bot",
+                                headers={"Authorization": f"Bot {token}"},
+                                timeout=aiohttp.ClientTimeout(total=10)) as response:
+                response.raise_for_status()
+                return int((await response.json())["shards"])
+    except Exception as e:
+        print(f"Could not get the recommended shard count: {e}")
+        return None
+
+
+async def fetch_json(port: int, path: str, timeout: float = 2.0) -> Any:
+    """GET on a worker's metrics server."""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", port), timeout)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n".encode("latin-1"))
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    if not head.startswith(b"HTTP/1.1 200"):
+        raise RuntimeError(head.split(b"\r\n", 1)[0].decode("latin-1"))
+    return json.loads(body)
+
+
+class Worker:
+    """One ``main.py`` process and its restart bookkeeping."""
+
+    def __init__(self, index: int, shard_ids: List[int], metrics_port: Optional[int]) -> None:
+        self.index: int = index
+        self.shard_ids: List[int] = shard_ids
+        self.metrics_port: Optional[int] = metrics_port
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.started_at: float = 0.0
+        self.restarts: int = 0
+        self.backoff: float = 0.0
+        self.last_exit: Optional[int] = None
+
+    def stats(self) -> Dict[str, Any]:
+        running = self.process is not None and self.process.returncode is None
+        return {
+            "pid": self.process.pid if running else None,
+            "shard_ids": self.shard_ids,
+            "uptime_s": round(time.monotonic() - self.started_at, 1) if running else 0.0,
+            "restarts": self.restarts,
+            "last_exit": self.last_exit,
+        }
+
+
+class Supervisor:
+    """Starts one worker per shard range and keeps them running."""
+
+    def __init__(self,
+                 shard_count: int,
+                 workers: int,
+                 metrics_port: Optional[int] = None,
+                 command: Optional[Sequence[str]] = None,
+                 identify_seconds: float = IDENTIFY_SECONDS,
+                 backoff_max: float = RESTART_BACKOFF_MAX) -> None:
+        self.shard_count: int = shard_count
+        self.command: List[str] = list(command or [sys.executable, MAIN])
+        self.identify_seconds: float = identify_seconds
+        self.backoff_max: float = backoff_max
+        self.workers: List[Worker] = [
+            Worker(index, shard_ids, metrics_port + 1 + index if metrics_port else None)
+            for index, shard_ids in enumerate(shard_ranges(shard_count, workers))
+        ]
+        self.stopping: asyncio.Event = asyncio.Event()
+
+    def _environment(self, worker: Worker) -> Dict[str, str]:
+        env = dict(os.environ)
+        env.update({
+            "SHARD_IDS": ",".join(str(s) for s in worker.shard_ids),
+            "SHARD_COUNT": str(self.shard_count),
+            "WORKER_INDEX": str(worker.index),
+            "WORKER_COUNT": str(len(self.workers)),
+            # Sonst kommen die Ausgaben der Worker erst blockweise an
+            "PYTHONUNBUFFERED": "1",
+        })
+        if worker.metrics_port:
+            env["WORKER_METRICS_PORT"] = str(worker.metrics_port)
+        return env
+
+    async def _start(self, worker: Worker) -> None:
+        worker.process = await asyncio.create_subprocess_exec(
+            *self.command,
+            env=self._environment(worker),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+        )
+        worker.started_at = time.monotonic()
+        print(f"Started worker {worker.index} (pid {worker.process.pid}) for shards "
+              f"{worker.shard_ids[0]}-{worker.shard_ids[-1]} of {self.shard_count}")
+
+    async def _forward_output(self, worker: Worker) -> None:
+        assert worker.process is not None and worker.process.stdout is not None
+        prefix = f"[worker {worker.index}] "
+        async for line in worker.process.stdout:
+            sys.stdout.write(prefix + line.decode("utf-8", "replace"))
+
+    async def _keep_running(self, worker: Worker, delay: float) -> None:
+        # Logins der Shards staffeln, discord trennt sonst die Verbindung
+        await asyncio.sleep(delay)
+        while not self.stopping.is_set():
+            await self._start(worker)
+            await self._forward_output(worker)
+            worker.last_exit = await worker.process.wait()
+            if self.stopping.is_set():
+                break
+            # Lief er eine Weile, ist das kein Absturz in Schleife
+            if time.monotonic() - worker.started_at > self.backoff_max:
+                worker.backoff = 0.0
+            worker.backoff = min(self.backoff_max, worker.backoff * 2 if worker.backoff else 1.0)
+            worker.restarts += 1
+            print(f"Worker {worker.index} exited with {worker.last_exit}, restarting in {worker.backoff:.0f}s")
+            try:
+                await asyncio.wait_for(self.stopping.wait(), timeout=worker.backoff)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self) -> None:
+        delay = 0.0
+        tasks = []
+        for worker in self.workers:
+            tasks.append(asyncio.create_task(self._keep_running(worker, delay)))
+            delay += len(worker.shard_ids) * self.identify_seconds
+        await self.stopping.wait()
+        await self._terminate()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stop(self) -> None:
+        self.stopping.set()
+
+    async def _terminate(self, timeout: float = 10.0) -> None:
+        running = [w.process for w in self.workers if w.process and w.process.returncode is None]
+        for process in running:
+            process.terminate()
+        try:
+            await asyncio.wait_for(asyncio.gather(*(p.wait() for p in running)), timeout)
+        except asyncio.TimeoutError:
+            for process in running:
+                if process.returncode is None:
+                    process.kill()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "shard_count": self.shard_count,
+            "workers": {w.index: w.stats() for w in self.workers},
+        }
+
+
+class AggregatingMetricsServer(MetricsServer):
+    """Metrics endpoint of the supervisor, adds up the workers' registries."""
+
+    def __init__(self, supervisor: Supervisor, **kwargs: Any) -> None:
+        super().__init__(MetricsRegistry(), sources={"supervisor": supervisor.stats}, **kwargs)
+        self.supervisor: Supervisor = supervisor
+        self.worker_stats: Dict[int, Any] = {}
+
+    async def refresh(self) -> None:
+        async def collect(worker: Worker) -> Any:
+            try:
+                snapshot = await fetch_json(worker.metrics_port, "/snapshot")
+                return snapshot, await fetch_json(worker.metrics_port, "/stats")
+            except Exception as e:
+                return None, {"error": str(e)}
+
+        workers = [w for w in self.supervisor.workers if w.metrics_port]
+        results = await asyncio.gather(*(collect(w) for w in workers))
+        registry = MetricsRegistry()
+        for worker, (snapshot, stats) in zip(workers, results):
+            if snapshot is not None:
+                registry.merge(snapshot)
+            self.worker_stats[worker.index] = stats
+        self.registry = registry
+
+    def stats(self) -> Dict[str, Any]:
+        result = super().stats()
+        result["workers"] = self.worker_stats
+        return result
+
+
+async def main() -> None:
+    load_dotenv()
+    shard_count = SHARD_COUNT
+    if shard_count is None:
+        shard_count = max(WORKERS, await recommended_shards(os.getenv("DISCORD_TOKEN", "")) or 1)
+    supervisor = Supervisor(shard_count, WORKERS, metrics_port=METRICS_PORT)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, supervisor.stop)
+    server = AggregatingMetricsServer(supervisor, port=METRICS_PORT) if METRICS_PORT else None
+    if server:
+        await server.start()
+    try:
+        await supervisor.run()
+    finally:
+        if server:
+            await server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
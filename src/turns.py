@@ -0,0 +1,147 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Hashable, List, Optional
+from src.metrics import TurnTrace
+
+POLICIES = ("queue", "replace-latest", "drop-oldest")
+
+
+class Turn:
+    """A user request waiting for its answer from Gemini."""
+
+    def __init__(self,
+                 msg: Dict[str, Any],
+                 voice_client: Any,
+                 speaker: Optional[Hashable] = None,
+                 replayable: bool = True,
+                 cache_key: Optional[str] = None,
+                 trace: Optional[TurnTrace] = None,
+                 audio: Optional[List[bytes]] = None) -> None:
+        self.msg: Dict[str, Any] = msg
+        self.voice_client: Any = voice_client
+        self.speaker: Optional[Hashable] = speaker
+        self.replayable: bool = replayable
+        self.cache_key: Optional[str] = cache_key
+        self.trace: Optional[TurnTrace] = trace
+        # Audio-Modus: PCM der Frage, das erst mit dem Start der Runde gesendet wird
+        self.audio: Optional[List[bytes]] = audio
+        self.enqueued_at: float = time.monotonic()
+        # True once answered, False if the turn was dropped
+        self.done: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def resolve(self, answered: bool) -> None:
+        if not self.done.done():
+            self.done.set_result(answered)
+            if not answered and self.trace:
+                self.trace.finish("dropped")
+
+
+class TurnScheduler:
+    """Bounded, per-speaker fair queue of pending turns for one session.
+
+    ``policy`` decides what happens when a turn arrives:
+
+    - ``queue``: keep everything, reject the new turn if ``max_pending`` is reached
+    - ``replace-latest``: a speaker's new turn replaces their pending ones
+    - ``drop-oldest``: make room by dropping the oldest pending turn
+
+    Speakers are served round-robin, so one chatty user cannot starve the
+    others. Turns that waited longer than ``max_wait`` seconds are discarded
+    instead of being answered late.
+    """
+
+    def __init__(self, max_pending: int = 4, policy: str = "queue", max_wait: float = 15.0) -> None:
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown turn policy: {policy}")
+        self.max_pending: int = max_pending
+        self.policy: str = policy
+        self.max_wait: float = max_wait
+        self.pending: "OrderedDict[Optional[Hashable], Deque[Turn]]" = OrderedDict()
+        self.wakeup: asyncio.Event = asyncio.Event()
+        self.submitted: int = 0
+        self.started: int = 0
+        self.rejected: int = 0
+        self.replaced: int = 0
+        self.dropped_oldest: int = 0
+        self.expired: int = 0
+        self.total_wait: float = 0.0
+        self.max_wait_seen: float = 0.0
+
+    def __len__(self) -> int:
+        return sum(len(q) for q in self.pending.values())
+
+    def submit(self, turn: Turn) -> bool:
+        """Adds a turn according to the policy, returns False if it was rejected."""
+        self.submitted += 1
+        if self.policy == "replace-latest":
+            for old in self.pending.pop(turn.speaker, ()):
+                self.replaced += 1
+                old.resolve(False)
+        if len(self) >= self.max_pending:
+            if self.policy == "queue":
+                self.rejected += 1
+                print(f"Turn queue full ({len(self)} waiting), dropping new turn")
+                turn.resolve(False)
+                return False
+            self._drop_oldest()
+        self.pending.setdefault(turn.speaker, deque()).append(turn)
+        self.wakeup.set()
+        return True
+
+    async def next(self) -> Turn:
+        """Waits for the next turn that is still worth answering."""
+        while True:
+            self._expire()
+            if self.pending:
+                speaker, queue = next(iter(self.pending.items()))
+                turn = queue.popleft()
+                del self.pending[speaker]
+                if queue:
+                    # Sprecher hinten anstellen, die anderen sind zuerst dran
+                    self.pending[speaker] = queue
+                waited = time.monotonic() - turn.enqueued_at
+                self.started += 1
+                self.total_wait += waited
+                self.max_wait_seen = max(self.max_wait_seen, waited)
+                return turn
+            self.wakeup.clear()
+            await self.wakeup.wait()
+
+    def clear(self) -> None:
+        for queue in self.pending.values():
+            for turn in queue:
+                turn.resolve(False)
+        self.pending.clear()
+
+    def _drop_oldest(self) -> None:
+        oldest_speaker = min(self.pending, key=lambda s: self.pending[s][0].enqueued_at)
+        queue = self.pending[oldest_speaker]
+        queue.popleft().resolve(False)
+        self.dropped_oldest += 1
+        if not queue:
+            del self.pending[oldest_speaker]
+
+    def _expire(self) -> None:
+        deadline = time.monotonic() - self.max_wait
+        for speaker in list(self.pending):
+            queue = self.pending[speaker]
+            while queue and queue[0].enqueued_at < deadline:
+                queue.popleft().resolve(False)
+                self.expired += 1
+                print("Discarding turn that waited too long")
+            if not queue:
+                del self.pending[speaker]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending_turns": len(self),
+            "submitted": self.submitted,
+            "started": self.started,
+            "rejected": self.rejected,
+            "replaced": self.replaced,
+            "dropped_oldest": self.dropped_oldest,
+            "expired": self.expired,
+            "avg_queue_wait_ms": round(self.total_wait / self.started * 1000, 1) if self.started else 0.0,
+            "max_queue_wait_ms": round(self.max_wait_seen * 1000, 1),
+        }
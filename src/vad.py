@@ -0,0 +1,121 @@
+import threading
+from typing import Any, Dict, List, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class EnergyVAD:
+    """Frame-energy / zero-crossing voice activity detection for captured PCM.
+
+    Works on 16-bit interleaved PCM in 20 ms frames. Speech has a wide
+    dynamic range, so an utterance whose loud frames are not ``noise_ratio``
+    times above its quiet frames is treated as steady noise. Otherwise a
+    frame counts as speech when its RMS clears a threshold between the noise
+    floor and the peaks (and an absolute minimum) and its zero-crossing rate
+    is not that of hiss. The whole utterance is analysed in one vectorised
+    pass.
+    """
+
+    def __init__(self,
+                 rate: int = 48000,
+                 channels: int = 2,
+                 frame_ms: int = 20,
+                 min_rms: float = 300.0,
+                 noise_ratio: float = 3.0,
+                 max_zcr: float = 0.35,
+                 min_speech_ms: int = 200,
+                 padding_ms: int = 200,
+                 split_silence_ms: int = 700) -> None:
+        self.rate: int = rate
+        self.channels: int = channels
+        self.frame_samples: int = rate * frame_ms // 1000
+        self.frame_bytes: int = self.frame_samples * channels * 2
+        self.min_rms: float = min_rms
+        self.noise_ratio: float = noise_ratio
+        self.max_zcr: float = max_zcr
+        self.min_speech_frames: int = max(1, min_speech_ms // frame_ms)
+        self.padding_frames: int = padding_ms // frame_ms
+        self.split_frames: int = max(1, split_silence_ms // frame_ms)
+        self._lock: threading.Lock = threading.Lock()
+        self.utterances: int = 0
+        self.dropped: int = 0
+        self.bytes_in: int = 0
+        self.bytes_out: int = 0
+
+    def speech_frames(self, pcm: bytes) -> List[bool]:
+        """Returns one speech/no-speech decision per full frame."""
+        count = len(pcm) // self.frame_bytes
+        if count == 0:
+            return []
+        if np is None:
+            return [True] * count
+        samples = np.frombuffer(pcm, dtype="<i2", count=count * self.frame_bytes // 2)
+        frames = samples.reshape(count, self.frame_samples, self.channels).mean(axis=2, dtype=np.float32)
+        rms = np.sqrt(np.mean(frames * frames, axis=1))
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / self.frame_samples
+        noise_floor, peak = np.percentile(rms, [10, 90])
+        if peak < max(self.min_rms, noise_floor * self.noise_ratio):
+            return [False] * count
+        threshold = max(self.min_rms, noise_floor + (peak - noise_floor) * 0.2)
+        return ((rms > threshold) & (zcr < self.max_zcr)).tolist()
+
+    def find_segments(self, pcm: bytes) -> List[Tuple[int, int]]:
+        """Byte ranges of speech, padded, split at pauses of ``split_silence_ms``."""
+        flags = self.speech_frames(pcm)
+        segments: List[Tuple[int, int]] = []
+        start = last = -1
+        for i, speech in enumerate(flags):
+            if not speech:
+                continue
+            if start < 0:
+                start = i
+            elif i - last > self.split_frames:
+                segments.append((start, last))
+                start = i
+            last = i
+        if start >= 0:
+            segments.append((start, last))
+
+        result: List[Tuple[int, int]] = []
+        for first, end in segments:
+            if end - first + 1 < self.min_speech_frames:
+                continue
+            begin = max(0, first - self.padding_frames) * self.frame_bytes
+            stop = min(len(pcm), (end + 1 + self.padding_frames) * self.frame_bytes)
+            result.append((begin, stop))
+        return result
+
+    def trim(self, pcm: bytes) -> bytes:
+        """Cuts leading and trailing silence, returns b"" for noise-only audio."""
+        segments = self.find_segments(pcm)
+        out = pcm[segments[0][0]:segments[-1][1]] if segments else b""
+        self._count(len(pcm), len(out))
+        return out
+
+    def split(self, pcm: bytes) -> List[bytes]:
+        """Returns the phrases of an utterance without the pauses between them."""
+        phrases = [pcm[begin:stop] for begin, stop in self.find_segments(pcm)]
+        self._count(len(pcm), sum(len(p) for p in phrases))
+        return phrases
+
+    def _count(self, bytes_in: int, bytes_out: int) -> None:
+        with self._lock:
+            self.utterances += 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            if not bytes_out:
+                self.dropped += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "utterances": self.utterances,
+                "dropped_as_noise": self.dropped,
+                "requests_saved": self.dropped,
+                "bytes_in": self.bytes_in,
+                "bytes_saved": self.bytes_in - self.bytes_out,
+            }
@@ -0,0 +1,203 @@
+import os
+import threading
+import wave
+from typing import Any, Dict, List
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from src.resample import CAPTURE_RATE, Downsampler
+from src.vad import EnergyVAD
+
+FEATURE_RATE: int = 16000
+FRAME: int = 400  # 25 ms bei 16 kHz
+HOP: int = 160    # 10 ms
+MEL_BANDS: int = 26
+COEFFICIENTS: int = 13
+# Abstand, ab dem ohne Vergleichswerte (nur eine Aufnahme) "kein Wake-Word" gilt
+DEFAULT_REFERENCE: float = 18.0
+
+ACCEPT = "accept"
+REJECT = "reject"
+UNSURE = "unsure"
+
+
+def _mel_filterbank() -> Any:
+    def hz_to_mel(hz: Any) -> Any:
+        return 2595.0 * np.log10(1.0 + hz / 700.0)
+
+    def mel_to_hz(mel: Any) -> Any:
+        return 700.0 * (10.0 ** (mel / 2595.0) - 1.0)
+
+    bins = FRAME // 2 + 1
+    edges = mel_to_hz(np.linspace(hz_to_mel(100.0), hz_to_mel(FEATURE_RATE / 2 * 0.9), MEL_BANDS + 2))
+    positions = edges / (FEATURE_RATE / 2) * (bins - 1)
+    freqs = np.arange(bins)
+    bank = np.zeros((MEL_BANDS, bins), dtype=np.float32)
+    for band in range(MEL_BANDS):
+        left, center, right = positions[band:band + 3]
+        rising = (freqs - left) / max(center - left, 1e-6)
+        falling = (right - freqs) / max(right - center, 1e-6)
+        bank[band] = np.clip(np.minimum(rising, falling), 0.0, None)
+    return bank
+
+
+class WakeWordSpotter:
+    """Local keyword spotting against recordings of the wake word.
+
+    Every WAV in ``template_dir`` (48 kHz stereo like discord, or 16 kHz mono)
+    is one person saying the wake word. The start of an utterance is turned
+    into MFCCs and matched against each recording with subsequence DTW, so
+    leading silence and speaking speed do not matter. The distance is
+    compared with how far the recordings are from each other:
+
+    - below ``reference * (1 + sensitivity)``: the wake word was said
+    - above twice that: it was not, the utterance is not uploaded
+    - in between: unsure; ``fallback`` decides whether Google Speech gets it
+
+    Without numpy or without recordings every utterance is accepted, i.e.
+    the bot behaves as if the spotter was not there.
+    """
+
+    def __init__(self,
+                 template_dir: str = "wakeword",
+                 sensitivity: float = 0.5,
+                 window_seconds: float = 1.0,
+                 fallback: bool = True) -> None:
+        self.sensitivity: float = sensitivity
+        self.window_bytes: int = int(window_seconds * CAPTURE_RATE) * 4
+        self.fallback: bool = fallback
+        self.templates: List[Any] = []
+        self.reference: float = DEFAULT_REFERENCE
+        self._lock: threading.Lock = threading.Lock()
+        self.checked: int = 0
+        self.accepted: int = 0
+        self.gated: int = 0
+        self.unsure: int = 0
+        self.bytes_saved: int = 0
+        if np is None:
+            print("Wake word spotting needs numpy, sending everything to speech recognition")
+            return
+        self._vad: EnergyVAD = EnergyVAD()
+        self._window = np.hamming(FRAME).astype(np.float32)
+        self._mel = _mel_filterbank()
+        n = np.arange(MEL_BANDS)
+        self._dct = np.cos(np.pi / MEL_BANDS * (n + 0.5)[None, :] * np.arange(1, COEFFICIENTS + 1)[:, None]).astype(np.float32)
+        self._load(template_dir)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.templates)
+
+    def _load(self, template_dir: str) -> None:
+        if not os.path.isdir(template_dir):
+            print(f"No wake word recordings in {template_dir}/, sending everything to speech recognition")
+            return
+        for name in sorted(os.listdir(template_dir)):
+            if not name.lower().endswith(".wav"):
+                continue
+            try:
+                features = self.features(load_wav(os.path.join(template_dir, name)))
+            except (OSError, ValueError, wave.Error) as e:
+                print(f"Skipping wake word recording {name}: {e}")
+                continue
+            if len(features):
+                self.templates.append(features)
+        if len(self.templates) > 1:
+            # Wie unterschiedlich klingt das Wake-Word bei den Aufnahmen untereinander?
+            distances = [
+                self._distance(a, b)
+                for i, a in enumerate(self.templates)
+                for j, b in enumerate(self.templates) if i != j
+            ]
+            self.reference = float(np.median(distances))
+        print(f"Loaded {len(self.templates)} wake word recordings (reference distance {self.reference:.1f})")
+
+    def features(self, mono16k: bytes) -> Any:
+        """MFCCs (frames x 13) with per-utterance mean removed."""
+        samples = np.frombuffer(mono16k, dtype="<i2", count=len(mono16k) // 2).astype(np.float32)
+        if len(samples) < FRAME:
+            return np.zeros((0, COEFFICIENTS), dtype=np.float32)
+        samples = np.append(samples[0], samples[1:] - 0.97 * samples[:-1])
+        frames = np.lib.stride_tricks.sliding_window_view(samples, FRAME)[::HOP] * self._window
+        power = np.abs(np.fft.rfft(frames, axis=1)) ** 2
+        mfcc = np.log(power @ self._mel.T + 1e-3) @ self._dct.T
+        return mfcc - mfcc.mean(axis=0)
+
+    def _distance(self, template: Any, utterance: Any) -> float:
+        """Subsequence DTW: best match of the whole template anywhere in the utterance.
+
+        Each template frame advances the utterance by 0, 1 or 2 frames, which
+        allows the word to be said up to twice as slowly or arbitrarily fast
+        and keeps every row of the recursion a single vectorised step.
+        """
+        if not len(template) or not len(utterance):
+            return float("inf")
+        cost = np.sqrt(((template[:, None, :] - utterance[None, :, :]) ** 2).sum(axis=2))
+        previous = cost[0]
+        for row in cost[1:]:
+            best = previous.copy()
+            best[1:] = np.minimum(best[1:], previous[:-1])
+            best[2:] = np.minimum(best[2:], previous[:-2])
+            previous = row + best
+        return float(previous.min()) / len(template)
+
+    def score(self, pcm: bytes) -> float:
+        """Smallest distance between the start of ``pcm`` (48 kHz stereo) and any recording."""
+        head = self._vad.trim(pcm[:self.window_bytes]) or pcm[:self.window_bytes]
+        features = self.features(Downsampler(FEATURE_RATE).convert(head))
+        return min(self._distance(t, features) for t in self.templates)
+
+    def classify(self, pcm: bytes) -> str:
+        if not self.enabled:
+            return ACCEPT
+        return self.verdict(self.score(pcm))
+
+    def verdict(self, distance: float) -> str:
+        accept_below = self.reference * (1.0 + self.sensitivity)
+        if distance <= accept_below:
+            return ACCEPT
+        if distance > accept_below * 2:
+            return REJECT
+        return UNSURE
+
+    def should_upload(self, pcm: bytes) -> bool:
+        """Gate in front of speech recognition, runs on a recognition worker."""
+        verdict = self.classify(pcm)
+        upload = verdict == ACCEPT or (verdict == UNSURE and self.fallback)
+        with self._lock:
+            self.checked += 1
+            if verdict == ACCEPT:
+                self.accepted += 1
+            elif verdict == UNSURE:
+                self.unsure += 1
+            if not upload:
+                self.gated += 1
+                self.bytes_saved += len(pcm)
+        return upload
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "checked": self.checked,
+                "accepted": self.accepted,
+                "unsure": self.unsure,
+                "gated": self.gated,
+                "requests_saved": self.gated,
+                "bytes_saved": self.bytes_saved,
+            }
+
+
+def load_wav(path: str) -> bytes:
+    """Reads a recording as 16 kHz mono 16-bit PCM without surrounding silence."""
+    with wave.open(path, "rb") as f:
+        fmt = (f.getframerate(), f.getnchannels(), f.getsampwidth())
+        pcm = f.readframes(f.getnframes())
+    if fmt not in ((FEATURE_RATE, 1, 2), (CAPTURE_RATE, 2, 2)):
+        raise ValueError(f"{path}: expected 48 kHz stereo or 16 kHz mono 16-bit")
+    # Stille vor und nach dem Wort würde sonst mitverglichen
+    pcm = EnergyVAD(rate=fmt[0], channels=fmt[1]).trim(pcm) or pcm
+    return pcm if fmt[0] == FEATURE_RATE else Downsampler(FEATURE_RATE).convert(pcm)
@@ -0,0 +1,121 @@
+"""Audio input mode of AudioProcessor against the local fake server.
+
+    pytest
+"""
+import asyncio
+import base64
+import time
+from typing import Any, Awaitable, Callable
+from src.fake_discord import PACKET_BYTES, FakeBot, FakeChannel, FakePacket, FakeUser, FakeVoiceClient, utterance
+from src.fake_gemini import FakeGeminiServer
+from src.gemini import INPUT_AUDIO_RATE, GeminiWebSocket
+from src.record import AudioProcessor
+
+ANSWER_SECONDS = 0.5
+
+
+def talk(processor: AudioProcessor, user: FakeUser, seconds: float) -> None:
+    """Replays an utterance like the voice receive thread, without waiting."""
+    pcm = utterance(seconds)
+    processor.on_voice_member_speaking_start(user)
+    for pos in range(0, len(pcm), PACKET_BYTES):
+        processor.write(user, FakePacket(user.id, pcm[pos:pos + PACKET_BYTES]))
+    processor.on_voice_member_speaking_stop(user)
+
+
+def talk_through_drop(processor: AudioProcessor, user: FakeUser, seconds: float,
+                      server: FakeGeminiServer, loop: asyncio.AbstractEventLoop) -> None:
+    """Like talk(), but the connection breaks in the middle of the question."""
+    pcm = utterance(seconds)
+    half = len(pcm) // 2 // PACKET_BYTES * PACKET_BYTES
+    processor.on_voice_member_speaking_start(user)
+    for pos in range(0, len(pcm), PACKET_BYTES):
+        if pos == half:
+            asyncio.run_coroutine_threadsafe(server.drop_all(), loop).result()
+            while processor.gemini_ws.is_connected():
+                time.sleep(0.01)
+        processor.write(user, FakePacket(user.id, pcm[pos:pos + PACKET_BYTES]))
+    processor.on_voice_member_speaking_stop(user)
+
+
+def audio_bytes_on_last_connection(server: FakeGeminiServer) -> int:
+    last_setup = max(i for i, msg in enumerate(server.received) if "setup" in msg)
+    return sum(len(base64.b64decode(chunk["data"]))
+               for msg in server.received[last_setup:] if "realtime_input" in msg
+               for chunk in msg["realtime_input"]["media_chunks"])
+
+
+def streamed_bytes(seconds: float) -> int:
+    return int(seconds * INPUT_AUDIO_RATE) * 2
+
+
+def run(test: Callable[[FakeGeminiServer, GeminiWebSocket, AudioProcessor], Awaitable[Any]],
+        multi_speaker: bool = False) -> None:
+    async def main() -> None:
+        async with FakeGeminiServer(answer_seconds=ANSWER_SECONDS) as server:
+            session = GeminiWebSocket(uri=server.uri)
+            await session.connect()
+            processor = AudioProcessor(FakeUser(1), FakeChannel(), FakeBot(asyncio.get_running_loop()), session,
+                                       input_mode="audio", multi_speaker=multi_speaker)
+            processor._voice_client = FakeVoiceClient()
+            try:
+                await test(server, session, processor)
+            finally:
+                await session.close()
+
+    asyncio.run(main())
+
+
+async def wait_for(condition: Callable[[], bool], timeout: float = 5.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_question_is_streamed_and_answered() -> None:
+    async def test(server: FakeGeminiServer, session: GeminiWebSocket, processor: AudioProcessor) -> None:
+        await asyncio.to_thread(talk, processor, processor.target_user, 1.0)
+        await wait_for(lambda: server.turns == 1 and not session.busy)
+        assert server.audio_bytes_received == streamed_bytes(1.0)
+        assert processor._voice_client.frames >= ANSWER_SECONDS / 0.02
+
+    run(test)
+
+
+def test_short_noise_is_not_a_turn() -> None:
+    async def test(server: FakeGeminiServer, session: GeminiWebSocket, processor: AudioProcessor) -> None:
+        await asyncio.to_thread(talk, processor, processor.target_user, 0.2)
+        await asyncio.sleep(0.2)
+        assert server.turns == 0
+
+    run(test)
+
+
+def test_audio_waits_until_the_previous_answer_is_done() -> None:
+    async def test(server: FakeGeminiServer, session: GeminiWebSocket, processor: AudioProcessor) -> None:
+        await asyncio.to_thread(talk, processor, processor.target_user, 1.0)
+        await wait_for(lambda: processor._voice_client.is_playing())
+        # Kürzer als BARGE_IN_SECONDS, die erste Antwort läuft weiter
+        await asyncio.to_thread(talk, processor, FakeUser(2), 0.4)
+        await asyncio.sleep(0.1)
+        assert session.busy
+        assert server.audio_bytes_received == streamed_bytes(1.0)
+        await wait_for(lambda: server.turns == 2 and not session.busy)
+        assert server.audio_bytes_received == streamed_bytes(1.0) + streamed_bytes(0.4)
+        assert session.interruptions == 0
+
+    run(test, multi_speaker=True)
+
+
+def test_question_is_sent_again_when_the_live_stream_breaks() -> None:
+    async def test(server: FakeGeminiServer, session: GeminiWebSocket, processor: AudioProcessor) -> None:
+        loop = asyncio.get_running_loop()
+        await asyncio.to_thread(talk_through_drop, processor, processor.target_user, 1.0, server, loop)
+        await wait_for(lambda: server.turns == 1 and not session.busy)
+        assert session.failed_audio_sends >= 1
+        # Die ganze Frage kam mit der Runde auf der neuen Verbindung an
+        assert audio_bytes_on_last_connection(server) == streamed_bytes(1.0)
+        assert processor._voice_client.frames >= ANSWER_SECONDS / 0.02
+
+    run(test)
@@ -0,0 +1,59 @@
+"""Barge-in, skipping the rest of an abandoned answer and timeouts.
+
+    pytest
+"""
+import asyncio
+from typing import Any, Awaitable, Callable
+from src.fake_discord import FakeVoiceClient
+from src.fake_gemini import FakeGeminiServer
+from src.gemini import GeminiWebSocket
+
+ANSWER_SECONDS = 0.5
+CHUNK_BYTES = 2400  # 50 ms bei 24 kHz mono
+
+
+def run(test: Callable[[FakeGeminiServer, GeminiWebSocket], Awaitable[Any]], **server_options: Any) -> None:
+    async def main() -> None:
+        async with FakeGeminiServer(answer_seconds=ANSWER_SECONDS, chunk_bytes=CHUNK_BYTES,
+                                    **server_options) as server:
+            session = GeminiWebSocket(uri=server.uri)
+            await session.connect()
+            try:
+                await test(server, session)
+            finally:
+                await session.close()
+
+    asyncio.run(main())
+
+
+async def wait_for(condition: Callable[[], bool], timeout: float = 5.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_next_turn_is_answered_after_the_server_interrupted_the_old_one() -> None:
+    async def test(server: FakeGeminiServer, session: GeminiWebSocket) -> None:
+        voice_client = FakeVoiceClient()
+        first = asyncio.create_task(session.process_text("erzähl was langes", voice_client))
+        await wait_for(voice_client.is_playing)
+        assert session.interrupt()
+        assert not await first
+        assert session.pending_drains == 1
+        # Der Server beendet die alte Antwort mit interrupted statt turnComplete
+        assert await asyncio.wait_for(session.process_text("und jetzt kurz", voice_client), timeout=3)
+        assert server.interrupted == 1
+        assert session.pending_drains == 0
+        assert session.drained_messages > 0
+
+    run(test, chunk_delay=0.02, interrupt_on_new_turn=True)
+
+
+def test_timeout_does_not_count_as_answered() -> None:
+    async def test(server: FakeGeminiServer, session: GeminiWebSocket) -> None:
+        session.recv_timeout = 0.1
+        assert not await session.process_text("hallo", FakeVoiceClient())
+        assert server.turns == 1
+
+    run(test, chunk_delay=0.5)
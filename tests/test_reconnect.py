@@ -0,0 +1,80 @@
+"""Reconnect and turn replay of GeminiWebSocket against the local fake server.
+
+    pytest
+"""
+import asyncio
+from typing import Any, Awaitable, Callable
+import pytest
+from src.fake_discord import FakeVoiceClient
+from src.fake_gemini import FakeGeminiServer
+from src.gemini import GeminiWebSocket, SessionClosed
+
+ANSWER_SECONDS = 0.2
+CHUNK_BYTES = 2400  # 50 ms bei 24 kHz mono
+FRAMES = int(ANSWER_SECONDS / 0.02)
+
+
+def run(test: Callable[[FakeGeminiServer, GeminiWebSocket], Awaitable[Any]]) -> None:
+    async def main() -> None:
+        async with FakeGeminiServer(answer_seconds=ANSWER_SECONDS, chunk_bytes=CHUNK_BYTES) as server:
+            session = GeminiWebSocket(uri=server.uri, backoff_initial=0.01)
+            await session.connect()
+            try:
+                await test(server, session)
+            finally:
+                await session.close()
+
+    asyncio.run(main())
+
+
+def test_turn_is_replayed_when_the_connection_drops_before_the_answer() -> None:
+    async def test(server: FakeGeminiServer, session: GeminiWebSocket) -> None:
+        voice_client = FakeVoiceClient()
+        server.drop_after_chunks = 0
+        assert await session.process_text("wie geht es dir", voice_client)
+        assert session.replayed_turns == 1
+        assert session.reconnects == 1
+        assert server.connects == 2
+        assert server.turns == 2
+        assert voice_client.frames >= FRAMES
+
+    run(test)
+
+
+def test_turn_is_not_replayed_once_the_answer_started() -> None:
+    async def test(server: FakeGeminiServer, session: GeminiWebSocket) -> None:
+        voice_client = FakeVoiceClient()
+        server.drop_after_chunks = 2
+        assert not await session.process_text("erzähl was", voice_client)
+        assert session.replayed_turns == 0
+        assert server.turns == 1
+        # Die nächste Frage bekommt eine neue Verbindung
+        assert await session.process_text("nochmal", voice_client)
+        assert session.reconnects == 1
+        assert server.turns == 2
+
+    run(test)
+
+
+def test_buffered_audio_is_sent_again_on_replay() -> None:
+    async def test(server: FakeGeminiServer, session: GeminiWebSocket) -> None:
+        audio = [bytes(3200)] * 5
+        server.drop_after_chunks = 0
+        assert await session.process_audio(FakeVoiceClient(), audio=audio)
+        assert session.replayed_turns == 1
+        assert server.audio_bytes_received == 2 * 5 * 3200
+
+    run(test)
+
+
+def test_closed_session_does_not_reconnect() -> None:
+    async def test(server: FakeGeminiServer, session: GeminiWebSocket) -> None:
+        await session.close()
+        with pytest.raises(SessionClosed):
+            await session.ensure_connected()
+        with pytest.raises(SessionClosed):
+            await session.process_text("hallo", FakeVoiceClient())
+        assert not session.is_connected()
+        assert server.connects == 1
+
+    run(test)